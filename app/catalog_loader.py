@@ -0,0 +1,62 @@
+"""
+Catalog loader for multi-worker deployments.
+
+Loads the product catalog from Qdrant, keeps it fresh and publishes every
+new version to CATALOG_SNAPSHOT_PATH. Workers started with
+CATALOG_SOURCE=shared map that file read-only instead of loading the
+catalog themselves, so Qdrant traffic and catalog memory don't grow with
+the number of workers. `app.serve` starts it alongside the workers; it can
+also run on its own:
+
+    python -m app.catalog_loader
+"""
+import logging
+import signal
+import threading
+
+from .config import get_settings
+from .services.catalog_service import CatalogService
+from .utils.request_log import configure_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+def main() -> None:
+    from qdrant_client import QdrantClient
+
+    settings = get_settings()
+    configure_logging(settings.log_level, settings.log_format)
+    if not settings.catalog_snapshot_path:
+        raise SystemExit("CATALOG_SNAPSHOT_PATH must be set to publish the catalog")
+
+    client = QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key, timeout=settings.qdrant_timeout)
+    try:
+        collection_names = [collection.name for collection in client.get_collections().collections]
+    except Exception as e:
+        # The refresh thread keeps retrying; workers serve the last published snapshot meanwhile
+        logger.warning(f"Could not list Qdrant collections: {str(e)}")
+    else:
+        if settings.qdrant_collection not in collection_names:
+            raise SystemExit(f"Collection {settings.qdrant_collection} not found in Qdrant")
+
+    catalog = CatalogService(
+        client,
+        settings.qdrant_collection,
+        refresh_interval=settings.catalog_refresh_interval,
+        check_interval=settings.catalog_check_interval,
+        snapshot_path=settings.catalog_snapshot_path
+    )
+    # Continue from the published generation so workers accept the next one
+    catalog.restore()
+    catalog.start()
+    logger.info(f"Publishing the {settings.qdrant_collection} catalog to {settings.catalog_snapshot_path}")
+
+    stopped = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopped.set())
+    stopped.wait()
+
+    catalog.stop()
+    shutdown_logging()
+
+if __name__ == "__main__":
+    main()
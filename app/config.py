@@ -1,26 +1,154 @@
+import hashlib
 import os
+import re
+import tempfile
 from functools import lru_cache
-from typing import Optional
+from typing import List, Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 
+def _default_catalog_snapshot_path(qdrant_url: Optional[str], collection: Optional[str]) -> str:
+    # One file per Qdrant deployment and collection, so unrelated processes
+    # on the same host never restore each other's catalog
+    deployment = hashlib.sha256((qdrant_url or "").encode("utf-8")).hexdigest()[:12]
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", collection or "default")
+    return os.path.join(tempfile.gettempdir(), f"brightside-catalog-{name}-{deployment}.bin")
+
 class Settings:
     # OpenAI settings
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    # Point at any OpenAI-compatible server, e.g. the benchmark stand-in
+    openai_base_url: Optional[str] = os.getenv("OPENAI_BASE_URL") or None
     gpt_model: str = os.getenv("GPT_MODEL", "gpt-3.5-turbo")
+    chat_prompt_token_budget: int = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "3000"))
+
+    # OpenAI admission control: adaptive concurrency between 1 and the max,
+    # overall per-request deadline (seconds) and retry budget
+    openai_initial_concurrency: int = int(os.getenv("OPENAI_INITIAL_CONCURRENCY", "8"))
+    openai_max_concurrency: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+    openai_deadline: float = float(os.getenv("OPENAI_DEADLINE", "30"))
+    openai_slow_call_seconds: float = float(os.getenv("OPENAI_SLOW_CALL_SECONDS", "20"))
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+
+    # Circuit breakers for Qdrant and OpenAI: a circuit opens when the share of
+    # failed (or slow) calls over a rolling window reaches a threshold, stays
+    # open for a while (seconds) and then lets a few probe calls through
+    circuit_window: float = float(os.getenv("CIRCUIT_WINDOW", "30"))
+    circuit_min_calls: int = int(os.getenv("CIRCUIT_MIN_CALLS", "20"))
+    circuit_failure_rate: float = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+    circuit_slow_call_rate: float = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+    circuit_open_seconds: float = float(os.getenv("CIRCUIT_OPEN_SECONDS", "15"))
+    circuit_half_open_calls: int = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "3"))
     
     # Qdrant settings
     qdrant_url: str = os.getenv("QDRANT_URL")
     qdrant_api_key: str = os.getenv("QDRANT_API_KEY")
     qdrant_collection: str = os.getenv("QDRANT_COLLECTION")
+    qdrant_timeout: int = int(os.getenv("QDRANT_TIMEOUT", "10"))
+    qdrant_max_workers: int = int(os.getenv("QDRANT_MAX_WORKERS", "8"))
+    qdrant_slow_call_seconds: float = float(os.getenv("QDRANT_SLOW_CALL_SECONDS", "2"))
+    # Hedged reads: repeat a Qdrant read that hasn't finished after the recent
+    # p95 read latency (but at least the minimum delay) and take the first answer
+    qdrant_hedge_reads: bool = os.getenv("QDRANT_HEDGE_READS", "true").lower() == "true"
+    qdrant_hedge_min_delay_ms: float = float(os.getenv("QDRANT_HEDGE_MIN_DELAY_MS", "20"))
+    # Search mode: "snapshot" serves /search from an in-memory catalog,
+    # "qdrant" pushes filters down to Qdrant and pages through results
+    search_mode: str = os.getenv("SEARCH_MODE", "snapshot").lower()
+    qdrant_indexed_fields: List[str] = [
+        field.strip() for field in os.getenv("QDRANT_INDEXED_FIELDS", "category,tier").split(",") if field.strip()
+    ]
+
+    # Semantic search: query embeddings from "openai" or the deterministic
+    # local "hashing" embedder, micro-batched and cached in memory
+    embedding_provider: str = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+    embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    embedding_dimensions: Optional[int] = int(os.getenv("EMBEDDING_DIMENSIONS")) if os.getenv("EMBEDDING_DIMENSIONS") else None
+    embedding_batch_window_ms: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    embedding_max_batch: int = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+    # Name of the collection's vector, for collections with named vectors
+    qdrant_vector_name: Optional[str] = os.getenv("QDRANT_VECTOR_NAME") or None
+
+    # Cache-Control for /search responses, which carry catalog-versioned ETags
+    search_cache_control: str = os.getenv("SEARCH_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=300")
+    # Last good /search bodies, served when Qdrant or OpenAI fails: "memory",
+    # "redis" or "none", and how long they stay usable (seconds)
+    search_stale_backend: str = os.getenv("SEARCH_STALE_BACKEND", "memory")
+    search_stale_size: int = int(os.getenv("SEARCH_STALE_SIZE", "2048"))
+    search_stale_ttl: float = float(os.getenv("SEARCH_STALE_TTL", "86400"))
+
+    # Catalog snapshot settings (seconds)
+    catalog_refresh_interval: float = float(os.getenv("CATALOG_REFRESH_INTERVAL", "300"))
+    catalog_check_interval: float = float(os.getenv("CATALOG_CHECK_INTERVAL", "30"))
+    # On-disk copy of the catalog served at boot before Qdrant answers ("" disables it)
+    catalog_snapshot_path: str = os.getenv(
+        "CATALOG_SNAPSHOT_PATH", _default_catalog_snapshot_path(qdrant_url, qdrant_collection)
+    )
+    # Where workers get the catalog: "qdrant" (each worker loads its own) or
+    # "shared" (map the snapshot a catalog loader publishes at the path above;
+    # see app.serve), and how often (seconds) shared workers look for a new one
+    catalog_source: str = os.getenv("CATALOG_SOURCE", "qdrant").lower()
+    catalog_watch_interval: float = float(os.getenv("CATALOG_WATCH_INTERVAL", "1"))
+    
+    # Classify result cache: "memory", "redis" or "none"
+    classify_cache_backend: str = os.getenv("CLASSIFY_CACHE_BACKEND", "memory")
+    classify_cache_size: int = int(os.getenv("CLASSIFY_CACHE_SIZE", "2048"))
+    classify_cache_ttl: float = float(os.getenv("CLASSIFY_CACHE_TTL", "3600"))
+    redis_url: Optional[str] = os.getenv("REDIS_URL")
+
+    # Ask for JSON-mode output from /classify (needs a model that supports response_format)
+    classify_json_mode: bool = os.getenv("CLASSIFY_JSON_MODE", "true").lower() == "true"
+
+    # Local classify fast path: "on" skips GPT for confident local verdicts,
+    # "shadow" (the default, until shadow agreement justifies "on") only logs
+    # agreement with GPT, "off" disables it
+    classify_fastpath_mode: str = os.getenv("CLASSIFY_FASTPATH", "shadow").lower()
+    classify_fastpath_threshold: float = float(os.getenv("CLASSIFY_FASTPATH_THRESHOLD", "0.9"))
+
+    # /answer pipeline: start generating with the full product context while
+    # classify runs (after a short head start for cached and fast-path
+    # verdicts), and keep that stream if the verdict drops at most this many products
+    answer_speculate: bool = os.getenv("ANSWER_SPECULATE", "true").lower() == "true"
+    answer_speculation_delay_ms: float = float(os.getenv("ANSWER_SPECULATION_DELAY_MS", "25"))
+    answer_keep_extra_products: int = int(os.getenv("ANSWER_KEEP_EXTRA_PRODUCTS", "2"))
+    
+    # Chat sessions: "memory" (LRU), "redis" or "none", idle TTL in seconds,
+    # and how much compacted older history is kept per session
+    session_backend: str = os.getenv("SESSION_BACKEND", "memory")
+    session_max_entries: int = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+    session_ttl: float = float(os.getenv("SESSION_TTL", "3600"))
+    session_summary_chars: int = int(os.getenv("SESSION_SUMMARY_CHARS", "1200"))
     
     # API key settings
     require_api_key: bool = os.getenv("REQUIRE_API_KEY", "").lower() == "true"
     expected_api_key: Optional[str] = os.getenv("EXPECTED_API_KEY")
+    # Per-client keys, accepted like the shared key; each gets its own rate
+    # limit buckets, while everyone else is limited per IP
+    client_api_keys: List[str] = [
+        key.strip() for key in os.getenv("CLIENT_API_KEYS", "").split(",") if key.strip()
+    ]
     
-    # Rate limiting
+    # Rate limiting: token buckets per client, "memory", "redis" or "none"
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
     rate_limit_per_hour: int = int(os.getenv("RATE_LIMIT_PER_HOUR", "20"))
+    search_rate_limit_per_hour: int = int(os.getenv("SEARCH_RATE_LIMIT_PER_HOUR", "1000"))
+
+    # Logging: "json" or "text" records written by a background thread, and
+    # the fraction of requests whose verbose payloads are logged
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "json").lower()
+    log_payload_sample_rate: float = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+    # Profiling: requests sent with `X-Profile: timing` (or `cprofile`) and this
+    # admin token ("" disables it) get a Server-Timing header (and a cProfile
+    # capture); sampled fractions of all requests are timed or captured too.
+    # Captures are kept in a bounded directory listed at /api/v1/admin/profiles
+    profile_admin_token: str = os.getenv("PROFILE_ADMIN_TOKEN", "")
+    profile_timing_sample_rate: float = float(os.getenv("PROFILE_TIMING_SAMPLE_RATE", "0"))
+    profile_capture_sample_rate: float = float(os.getenv("PROFILE_CAPTURE_SAMPLE_RATE", "0"))
+    profile_dir: str = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "brightside-profiles"))
+    profile_max_files: int = int(os.getenv("PROFILE_MAX_FILES", "50"))
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -1,6 +1,21 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import chat, search, classify
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .config import get_settings
+from .routes import admin, answer, chat, search, classify
+from .services.gpt_service import get_gpt_service
+from .services.qdrant_service import get_qdrant_service
+from .services.upstream import Overloaded
+from .utils.metrics import REGISTRY, MetricsMiddleware
+from .utils.profiling import ProfilingMiddleware, get_profile_store
+from .utils.rate_limit import retry_after_header
+from .utils.request_log import RequestLogMiddleware, configure_logging, shutdown_logging
+
+settings = get_settings()
+configure_logging(settings.log_level, settings.log_format)
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Brightside API",
@@ -24,13 +39,93 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"]
 )
+# Inside the request log and metrics middlewares (only CORS, added first, is
+# further in), so request IDs are set and Server-Timing covers the app itself
+app.add_middleware(
+    ProfilingMiddleware,
+    store=get_profile_store(),
+    token=settings.profile_admin_token,
+    timing_sample_rate=settings.profile_timing_sample_rate,
+    capture_sample_rate=settings.profile_capture_sample_rate
+)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestLogMiddleware, payload_sample_rate=settings.log_payload_sample_rate)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed requests get a fast 503 the client can retry, not a slow 500."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers=retry_after_header(exc.retry_after)
+    )
 
 # Include routers
 app.include_router(chat.router, prefix="/api/v1", tags=["chat"])
 app.include_router(search.router, prefix="/api/v1", tags=["search"])
 app.include_router(classify.router, prefix="/api/v1", tags=["classify"])
+app.include_router(answer.router, prefix="/api/v1", tags=["answer"])
+app.include_router(admin.router, prefix="/api/v1", tags=["admin"], include_in_schema=False)
+
+async def _warm_up_services() -> None:
+    """
+    Warm up the Qdrant and OpenAI clients concurrently, retrying whichever
+    is not ready yet with capped exponential backoff.
+    """
+    qdrant_service = get_qdrant_service()
+    gpt_service = get_gpt_service()
+    delay = 1.0
+    while True:
+        pending = []
+        if not qdrant_service.ready:
+            pending.append(("qdrant", qdrant_service.run_blocking(qdrant_service.warmup)))
+        if not gpt_service.ready:
+            pending.append(("openai", gpt_service.warmup()))
+        if not pending:
+            logger.info("All services warmed up")
+            return
+
+        results = await asyncio.gather(*(warmup for _, warmup in pending), return_exceptions=True)
+        for (name, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.warning(f"{name} warmup failed, retrying in {delay:.0f}s: {str(result)}")
+
+        if qdrant_service.ready and gpt_service.ready:
+            continue
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
+
+@app.on_event("startup")
+async def start_services():
+    """Construct services and warm them up in the background so the worker boots immediately."""
+    app.state.warmup_task = asyncio.create_task(_warm_up_services())
+
+@app.on_event("shutdown")
+async def stop_services():
+    app.state.warmup_task.cancel()
+    get_qdrant_service().close()
+    await get_gpt_service().close()
+    shutdown_logging()
 
 @app.get("/health")
 async def health_check():
     """Simple health check endpoint."""
     return {"status": "ok"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once both upstream clients are warmed up, 503 until then."""
+    checks = {
+        "qdrant": get_qdrant_service().ready,
+        "openai": get_gpt_service().ready
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "checks": checks}
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics in the text exposition format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
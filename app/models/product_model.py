@@ -1,5 +1,6 @@
 from typing import Dict, Any
 from .schemas import Product
+from ..utils.json_response import dumps
 
 def normalize_product(raw: Dict[str, Any]) -> Product:
     """
@@ -23,3 +24,10 @@ def normalize_product(raw: Dict[str, Any]) -> Product:
         category=raw.get("category", "uncategorized"),
         variant_id=raw.get("variant_id")
     )
+
+def encode_product(product: Product) -> bytes:
+    """
+    Encode a normalized product to the JSON bytes it is served as, so
+    responses can splice it in without re-validating or re-encoding.
+    """
+    return dumps(product.dict())
@@ -1,6 +1,9 @@
-from typing import Dict, List, Optional, TypedDict
+from typing import Dict, List, Literal, Optional, TypedDict
 from pydantic import BaseModel, Field
 
+# Upper bound on the items in one batch request
+MAX_BATCH_ITEMS = 20
+
 class Product(BaseModel):
     id: str
     title: str
@@ -24,6 +27,14 @@ class ChatContext(TypedDict, total=False):
     answers: List[QuizAnswer]
     summary: str
     chatMessages: List[ChatMessage]
+    # Compacted history older than the recent messages (server-side sessions only)
+    conversationSummary: str
+
+class ContextDelta(BaseModel):
+    """Changes to a session's context; each field that is set replaces the stored value."""
+    products: Optional[List[Product]] = None
+    answers: Optional[List[QuizAnswer]] = None
+    summary: Optional[str] = None
 
 class ChatRequest(BaseModel):
     message: str
@@ -34,13 +45,62 @@ class ChatRequest(BaseModel):
             "chatMessages": []
         }
     )
+    # Continue a server-side session: only the new message and any context
+    # changes are sent, and `context` is ignored
+    session_id: Optional[str] = None
+    context_delta: Optional[ContextDelta] = None
+    # Start a session seeded from `context`; its ID is returned in the response
+    start_session: bool = False
 
 class ChatResponse(BaseModel):
     reply: str
+    session_id: Optional[str] = None
 
 class SearchRequest(BaseModel):
+    # Free-text query for semantic search; filters still apply to its results
+    query: Optional[str] = Field(default=None, max_length=500)
     filters: Optional[Dict[str, str]] = None
     limit: Optional[int] = Field(default=10, ge=1, le=100)
+    cursor: Optional[str] = None
 
 class SearchResponse(BaseModel):
     products: List[Product]
+    next_cursor: Optional[str] = None
+
+class BatchItemError(BaseModel):
+    status_code: int
+    detail: str
+
+class SearchBatchRequest(BaseModel):
+    requests: List[SearchRequest] = Field(..., min_items=1, max_items=MAX_BATCH_ITEMS)
+
+class SearchBatchItem(BaseModel):
+    result: Optional[SearchResponse] = None
+    error: Optional[BatchItemError] = None
+    # The result is an earlier answer, served because an upstream is failing
+    stale: bool = False
+
+class SearchBatchResponse(BaseModel):
+    results: List[SearchBatchItem]
+
+class ClassifyProduct(BaseModel):
+    title: str
+    description: str
+
+class ClassifyRequest(BaseModel):
+    message: str
+    products: List[ClassifyProduct]
+
+class ClassifyResponse(BaseModel):
+    status: Literal['ok', 'fallback']
+    required_context: List[str]
+
+class ClassifyBatchRequest(BaseModel):
+    requests: List[ClassifyRequest] = Field(..., min_items=1, max_items=MAX_BATCH_ITEMS)
+
+class ClassifyBatchItem(BaseModel):
+    result: Optional[ClassifyResponse] = None
+    error: Optional[BatchItemError] = None
+
+class ClassifyBatchResponse(BaseModel):
+    results: List[ClassifyBatchItem]
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+from ..config import get_settings
+from ..utils.profiling import PROFILE_TOKEN_HEADER, ProfileStore, get_profile_store, profile_token_valid
+
+router = APIRouter()
+
+def validate_profile_token(request: Request) -> None:
+    """Admin endpoints exist only when PROFILE_ADMIN_TOKEN is set, and require it."""
+    token = get_settings().profile_admin_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profile_token_valid(request.headers.get(PROFILE_TOKEN_HEADER), token):
+        raise HTTPException(status_code=401, detail="Invalid or missing profile token")
+
+@router.get("/admin/profiles")
+def list_profiles(
+    _: None = Depends(validate_profile_token),
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """Captured request profiles, newest first."""
+    return {"profiles": store.list()}
+
+@router.get("/admin/profiles/{name}")
+def download_profile(
+    name: str,
+    _: None = Depends(validate_profile_token),
+    store: ProfileStore = Depends(get_profile_store)
+) -> Response:
+    """
+    Download one captured profile as a `pstats` dump, e.g. for
+    `python -m pstats <file>` or snakeviz.
+    """
+    path = store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    with open(path, "rb") as f:
+        content = f.read()
+    return Response(
+        content,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{name}"'}
+    )
@@ -0,0 +1,49 @@
+from typing import AsyncIterator
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import StreamingResponse
+from ..models.schemas import ChatRequest
+from ..services.answer_service import AnswerService, get_answer_service
+from ..services.session_service import SessionService, get_session_service
+from ..utils import validate_api_key, check_rate_limit
+from ..utils.profiling import phase, phase_since_start
+from ..utils.streaming import Event, event_stream_response
+
+router = APIRouter()
+
+@router.post("/answer")
+async def answer(
+    request: Request,
+    chat_request: ChatRequest,
+    _: None = Depends(validate_api_key),
+    answer_service: AnswerService = Depends(get_answer_service),
+    session_service: SessionService = Depends(get_session_service)
+) -> StreamingResponse:
+    """
+    Classify the message against the context's products and stream the
+    answer in one request, instead of /classify followed by /chat.
+
+    Emits a `verdict` event with the classify result, `delta` events as the
+    reply is generated, and a final `done` event with the status ("ok", or
+    "fallback" with no reply), the full reply, end-to-end timings and the
+    session ID when the conversation is kept server-side.
+    """
+    phase_since_start("parse")
+    # Classify and chat each count against the rate limit, as they did as two requests
+    await check_rate_limit(request.client.host, request, cost=2)
+
+    with phase("session"):
+        session, context = await session_service.resolve(chat_request)
+
+    async def events() -> AsyncIterator[Event]:
+        answers = answer_service.answer(chat_request.message, context)
+        try:
+            async for event, data in answers:
+                if event == "done" and session is not None:
+                    if data["reply"]:
+                        await session_service.record_turn(session, chat_request.message, data["reply"])
+                    data = {**data, "session_id": session.id}
+                yield event, data
+        finally:
+            await answers.aclose()
+
+    return event_stream_response(request, events())
@@ -1,7 +1,12 @@
+from typing import AsyncIterator
 from fastapi import APIRouter, Request, Depends
+from fastapi.responses import StreamingResponse
 from ..models.schemas import ChatRequest, ChatResponse
-from ..services.gpt_service import gpt_service
+from ..services.gpt_service import GPTService, get_gpt_service
+from ..services.session_service import SessionService, get_session_service
 from ..utils import validate_api_key, check_rate_limit
+from ..utils.profiling import phase, phase_since_start
+from ..utils.streaming import Event, event_stream_response
 
 router = APIRouter()
 
@@ -9,18 +14,73 @@ router = APIRouter()
 async def chat(
     request: Request,
     chat_request: ChatRequest,
-    _: None = Depends(validate_api_key)
+    _: None = Depends(validate_api_key),
+    gpt_service: GPTService = Depends(get_gpt_service),
+    session_service: SessionService = Depends(get_session_service)
 ) -> ChatResponse:
     """
     Chat endpoint that uses GPT to answer questions about products.
+
+    With `start_session` or a `session_id`, the conversation is kept
+    server-side and later turns only need the new message.
     """
+    phase_since_start("parse")
     # Check rate limit
-    check_rate_limit(request.client.host, request)
+    await check_rate_limit(request.client.host, request)
+
+    with phase("session"):
+        session, context = await session_service.resolve(chat_request)
     
     # Get response from GPT service
     reply = await gpt_service.ask_about_products(
         message=chat_request.message,
-        context=chat_request.context
+        context=context
     )
-    
-    return ChatResponse(reply=reply)
+
+    if session is None:
+        return ChatResponse(reply=reply)
+    with phase("session"):
+        await session_service.record_turn(session, chat_request.message, reply)
+    return ChatResponse(reply=reply, session_id=session.id)
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: Request,
+    chat_request: ChatRequest,
+    _: None = Depends(validate_api_key),
+    gpt_service: GPTService = Depends(get_gpt_service),
+    session_service: SessionService = Depends(get_session_service)
+) -> StreamingResponse:
+    """
+    Streaming chat endpoint. Emits `delta` events as the reply is generated
+    and a final `done` event carrying the full reply (and session ID, when
+    the conversation is kept server-side).
+    """
+    phase_since_start("parse")
+    # Check rate limit
+    await check_rate_limit(request.client.host, request)
+
+    with phase("session"):
+        session, context = await session_service.resolve(chat_request)
+
+    async def events() -> AsyncIterator[Event]:
+        deltas = gpt_service.stream_about_products(
+            message=chat_request.message,
+            context=context
+        )
+        parts = []
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield "delta", {"delta": delta}
+        finally:
+            await deltas.aclose()
+        reply = "".join(parts).strip()
+        if session is None:
+            yield "done", {"reply": reply}
+            return
+        await session_service.record_turn(session, chat_request.message, reply)
+        yield "done", {"reply": reply, "session_id": session.id}
+
+    return event_stream_response(request, events())
@@ -1,56 +1,244 @@
-from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import JSONResponse
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from urllib.parse import urlencode
+from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi.responses import RedirectResponse, Response
+from pydantic import ValidationError
 import logging
-from ..models.schemas import SearchRequest, SearchResponse
-from ..services.qdrant_service import qdrant_service
+from ..config import get_settings
+from ..models.schemas import SearchBatchRequest, SearchBatchResponse, SearchRequest, SearchResponse
+from ..services.embedding_service import EmbeddingService, get_embedding_service
+from ..services.qdrant_service import ProductPage, QdrantService, get_qdrant_service
+from ..services.upstream import Overloaded
+from ..utils import check_rate_limit
+from ..utils.batch import batch_error, distinct_count, run_batch
+from ..utils.cache import ResultCache, create_cache_backend
+from ..utils.http_cache import cache_headers, content_etag, not_modified
+from ..utils.json_response import RawJSONResponse, dumps, products_body, splice_array
+from ..utils.profiling import phase, phase_since_start
+from ..utils.request_log import log_fields, log_payload
+from ..utils.singleflight import flight_key
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post("/search", response_model=SearchResponse)
-async def search(
+# Query parameters of GET /search that are not filters
+SEARCH_RESERVED_PARAMS = frozenset({"limit", "cursor", "query"})
+
+# Headers of a stale search body served during an upstream failure
+STALE_HEADERS = {"Cache-Control": "no-store", "Warning": '110 - "Response is Stale"'}
+
+class SearchBody(NamedTuple):
+    body: bytes
+    results: int
+    # Version of the catalog snapshot the page was served from, if any
+    catalog_version: Optional[str] = None
+    stale: bool = False
+
+@lru_cache()
+def get_stale_search_cache() -> ResultCache:
+    """Return the process-wide cache of last good search bodies, creating it on first use."""
+    settings = get_settings()
+    backend = create_cache_backend(
+        settings.search_stale_backend,
+        max_entries=settings.search_stale_size,
+        redis_url=settings.redis_url
+    )
+    return ResultCache(backend, ttl=settings.search_stale_ttl, namespace="search_stale")
+
+def _upstream_failed(error: Exception) -> bool:
+    # Open circuits, shed load and server errors; not bad requests
+    return not isinstance(error, HTTPException) or error.status_code >= 500
+
+async def _search_page(
+    search_request: SearchRequest,
+    qdrant_service: QdrantService,
+    embedding_service: EmbeddingService
+) -> ProductPage:
+    if search_request.query:
+        with phase("embedding"):
+            vector = await embedding_service.embed_query(search_request.query)
+        return await qdrant_service.semantic_page_async(
+            query=search_request.query,
+            vector=vector,
+            filters=search_request.filters,
+            limit=search_request.limit,
+            cursor=search_request.cursor
+        )
+    return await qdrant_service.query_products_page_async(
+        filters=search_request.filters,
+        limit=search_request.limit,
+        cursor=search_request.cursor
+    )
+
+async def _search_body(
+    search_request: SearchRequest,
+    qdrant_service: QdrantService,
+    embedding_service: EmbeddingService,
+    stale_cache: ResultCache
+) -> SearchBody:
+    """
+    Run a search and encode its body.
+
+    Bodies that took a Qdrant or OpenAI round-trip are remembered, and when
+    a later identical search fails upstream (an open circuit, shed load or
+    a server error) the last good body is served instead of the error.
+    Snapshot pages need neither upstream, so they are not kept.
+    """
+    key = flight_key(search_request.dict())
+    try:
+        page = await _search_page(search_request, qdrant_service, embedding_service)
+    except Exception as e:
+        if not _upstream_failed(e):
+            raise
+        stale = await stale_cache.get(key)
+        if stale is None:
+            raise
+        log_fields(stale=True, stale_reason=type(e).__name__)
+        return SearchBody(stale["body"].encode("utf-8"), stale["results"], stale=True)
+
+    body = products_body(page.encoded, page.next_cursor)
+    if page.catalog_version is None:
+        # Kept off the response path: with Redis this is a round-trip per search
+        stale_cache.set_later(key, {"body": body.decode("utf-8"), "results": len(page.products)})
+    return SearchBody(body, len(page.products), page.catalog_version)
+
+def _request_etag(catalog_version: str, search_request: SearchRequest) -> str:
+    return f'"{catalog_version}-{flight_key(search_request.dict())[:16]}"'
+
+async def _search_response(
     request: Request,
-    search_request: SearchRequest
-) -> SearchResponse:
+    search_request: SearchRequest,
+    qdrant_service: QdrantService,
+    embedding_service: EmbeddingService,
+    stale_cache: ResultCache
+) -> Response:
     """
-    Search endpoint that returns product recommendations based on filters.
+    Run a search and return its body with an ETag and Cache-Control.
+
+    Pages served from the catalog snapshot are tagged with the catalog
+    version and the canonical request, so a matching `If-None-Match` is
+    answered with 304 before any work is done. Other pages are tagged with
+    a hash of their body. Stale bodies are marked as such and not cached.
     """
+    cache_control = get_settings().search_cache_control
+    catalog_version = None if search_request.query else qdrant_service.catalog_version
+    if catalog_version is not None:
+        cached = not_modified(request, _request_etag(catalog_version, search_request), cache_control)
+        if cached is not None:
+            log_fields(not_modified=True)
+            return cached
+
+    log_payload(search_request=search_request.dict())
     try:
-        # Log request details
-        logger.info("="*50)
-        logger.info("🔍 New Search Request Received")
-        logger.info(f"📝 Request ID: {id(request)}")
-        logger.info(f"🔗 Client IP: {request.client.host}")
-        logger.info(f"📦 Request Body: {search_request.dict()}")
-        logger.info(f"🔍 Filters: {search_request.filters}")
-        logger.info(f"📊 Limit: {search_request.limit}")
-        
-        # Query products from Qdrant
-        logger.info("🔄 Querying Qdrant database...")
-        products = qdrant_service.query_products_with_filters(
-            filters=search_request.filters,
-            limit=search_request.limit
-        )
-        
-        # Log response details
-        logger.info(f"✅ Query successful - Found {len(products)} products")
-        if products:
-            logger.info("📋 First product details:")
-            first_product = products[0]
-            logger.info(f"  - ID: {first_product.id}")
-            logger.info(f"  - Title: {first_product.title}")
-            logger.info(f"  - Price: {first_product.price}")
-            logger.info(f"  - Category: {first_product.category}")
-            logger.info(f"  - Tier: {first_product.tier}")
-        
-        logger.info("="*50)
-        return SearchResponse(products=products)
+        result = await _search_body(search_request, qdrant_service, embedding_service, stale_cache)
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
-        logger.error("❌ Error processing search request")
-        logger.error(f"Error type: {type(e).__name__}")
-        logger.error(f"Error message: {str(e)}", exc_info=True)
-        logger.error("="*50)
+        logger.error(f"Error processing search request: {type(e).__name__}: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing search request: {str(e)}"
         )
+    log_fields(filters=search_request.filters, limit=search_request.limit, results=result.results)
+    if result.stale:
+        return RawJSONResponse(result.body, headers=STALE_HEADERS)
+
+    # Tag with the version the page was actually served from, in case the catalog just changed
+    if result.catalog_version is not None:
+        etag = _request_etag(result.catalog_version, search_request)
+    else:
+        etag = content_etag(result.body)
+    cached = not_modified(request, etag, cache_control)
+    if cached is not None:
+        log_fields(not_modified=True)
+        return cached
+    return RawJSONResponse(result.body, headers=cache_headers(etag, cache_control))
+
+@router.post("/search", response_model=SearchResponse)
+async def search(
+    request: Request,
+    search_request: SearchRequest,
+    qdrant_service: QdrantService = Depends(get_qdrant_service),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    stale_cache: ResultCache = Depends(get_stale_search_cache)
+) -> Response:
+    """
+    Search endpoint that returns product recommendations based on filters,
+    or ranked by similarity to a free-text `query` when one is given.
+
+    The body is spliced from pre-encoded products, so it skips response
+    model validation; `SearchResponse` still documents its shape.
+    """
+    phase_since_start("parse")
+    # Check rate limit
+    await check_rate_limit(request.client.host, request, scope="search")
+    return await _search_response(request, search_request, qdrant_service, embedding_service, stale_cache)
+
+@router.get("/search", response_model=SearchResponse)
+async def search_get(
+    request: Request,
+    qdrant_service: QdrantService = Depends(get_qdrant_service),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    stale_cache: ResultCache = Depends(get_stale_search_cache)
+) -> Response:
+    """
+    Cacheable GET variant of /search: `limit`, `cursor` and `query` are
+    reserved parameters and every other parameter is an exact-match filter,
+    e.g. `/search?category=sleep&tier=premium&limit=10`.
+
+    Non-canonical query strings are redirected to the canonical one (sorted
+    parameters, one value each) so CDNs keep a single cache entry per search.
+    """
+    phase_since_start("parse")
+    params = dict(request.query_params)
+    canonical = urlencode(sorted(params.items()))
+    if request.url.query != canonical:
+        return RedirectResponse(f"{request.url.path}?{canonical}" if canonical else request.url.path, status_code=308)
+
+    # Check rate limit
+    await check_rate_limit(request.client.host, request, scope="search")
+
+    filters = {key: value for key, value in params.items() if key not in SEARCH_RESERVED_PARAMS}
+    try:
+        search_request = SearchRequest(
+            query=params.get("query"),
+            filters=filters or None,
+            limit=params.get("limit", 10),
+            cursor=params.get("cursor")
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    return await _search_response(request, search_request, qdrant_service, embedding_service, stale_cache)
+
+@router.post("/search/batch", response_model=SearchBatchResponse)
+async def search_batch(
+    request: Request,
+    batch_request: SearchBatchRequest,
+    qdrant_service: QdrantService = Depends(get_qdrant_service),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    stale_cache: ResultCache = Depends(get_stale_search_cache)
+) -> Response:
+    """
+    Run several searches in one round-trip. Identical searches run once and
+    items run concurrently; each item carries its own result or error.
+    """
+    phase_since_start("parse")
+    items = batch_request.requests
+    unique = distinct_count(items, SearchRequest.dict)
+    # Each distinct search counts against the rate limit
+    await check_rate_limit(request.client.host, request, scope="search", cost=unique)
+    log_fields(batch_items=len(items), batch_unique=unique)
+
+    outcomes = await run_batch(
+        items,
+        lambda item: _search_body(item, qdrant_service, embedding_service, stale_cache),
+        SearchRequest.dict
+    )
+    bodies = []
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            bodies.append(b'{"result":null,"error":' + dumps(batch_error(outcome)) + b',"stale":false}')
+        else:
+            bodies.append(b'{"result":' + outcome.body + b',"error":null,"stale":' + dumps(outcome.stale) + b"}")
+    return RawJSONResponse(b'{"results":' + splice_array(bodies) + b"}")
@@ -0,0 +1,42 @@
+"""
+Multi-worker server: one catalog loader process plus several uvicorn
+workers that all map the catalog snapshot it publishes.
+
+    python -m app.serve --workers 4 --host 0.0.0.0 --port 8000
+
+Workers run with CATALOG_SOURCE=shared, so only the loader reads the
+catalog from Qdrant. Putting CATALOG_SNAPSHOT_PATH on a tmpfs such as
+/dev/shm keeps the shared pages in memory.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the API with several workers sharing one catalog")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # The loader reads Qdrant itself; settings are read when workers import
+    # the app, so set their source before they start
+    loader = subprocess.Popen(
+        [sys.executable, "-m", "app.catalog_loader"],
+        env={**os.environ, "CATALOG_SOURCE": "qdrant"}
+    )
+    os.environ["CATALOG_SOURCE"] = "shared"
+    try:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        loader.terminate()
+        try:
+            loader.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            loader.kill()
+
+if __name__ == "__main__":
+    main()
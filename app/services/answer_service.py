@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from ..config import get_settings
+from ..models.schemas import ClassifyProduct, ClassifyResponse
+from ..utils.request_log import log_fields
+from ..utils.streaming import Event
+from .classify_service import ClassifyService, get_classify_service
+from .gpt_service import GPTService, get_gpt_service
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+def _product_field(product: Any, name: str) -> Any:
+    # Context products arrive as plain dicts or as validated pydantic models
+    if isinstance(product, dict):
+        return product.get(name)
+    return getattr(product, name, None)
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+class DeltaPump:
+    """
+    Drains a stream of text deltas in the background, buffering them until
+    they are read, so generation can start before we know whether its
+    output will be used. Cancelling closes the source stream, which cancels
+    generation upstream.
+    """
+
+    def __init__(self, deltas: AsyncIterator[str]):
+        self._deltas = deltas
+        self._queue: "asyncio.Queue[Union[str, Exception, object]]" = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        try:
+            async for delta in self._deltas:
+                self._queue.put_nowait(delta)
+            self._queue.put_nowait(_END)
+        except Exception as e:
+            self._queue.put_nowait(e)
+        finally:
+            await self._deltas.aclose()
+
+    async def read(self) -> AsyncIterator[str]:
+        """Buffered deltas first, then the rest as they arrive."""
+        while True:
+            item = await self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def cancel(self) -> None:
+        if self._task.done():
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+class AnswerService:
+    """
+    Classify-then-answer as one server-side pipeline, replacing a /classify
+    round-trip followed by a /chat round-trip from the client.
+
+    While classify runs, generation speculatively starts with the full
+    product context (after a short head start, so cached and fast-path
+    verdicts never speculate). Its output is buffered until the verdict
+    arrives: a fallback verdict cancels it and ends the answer at once; a
+    verdict that keeps all but `keep_extra_products` of the products keeps
+    it; otherwise it is cancelled and generation restarts with only the
+    products classify selected.
+    """
+
+    def __init__(
+        self,
+        gpt_service: GPTService,
+        classify_service: ClassifyService,
+        speculate: bool = True,
+        speculation_delay: float = 0.025,
+        keep_extra_products: int = 2
+    ):
+        self.gpt_service = gpt_service
+        self.classify_service = classify_service
+        self.speculate = speculate
+        self.speculation_delay = speculation_delay
+        self.keep_extra_products = keep_extra_products
+
+    async def answer(self, message: str, context: Dict) -> AsyncIterator[Event]:
+        """
+        Stream the answer as events: `verdict` (the classify result, when
+        the context has products), `delta` text chunks, and a final `done`
+        carrying the status, full reply, what happened to the speculative
+        stream and end-to-end timings in milliseconds.
+        """
+        started = time.perf_counter()
+        timing: Dict[str, float] = {}
+        products = list(context.get("products") or [])
+        classify_task: Optional["asyncio.Future[ClassifyResponse]"] = None
+        speculative: Optional[DeltaPump] = None
+        stream: Optional[DeltaPump] = None
+        speculation = "none"
+        try:
+            if products:
+                classify_task = asyncio.ensure_future(self._classify(message, products))
+                if self.speculate:
+                    done, _ = await asyncio.wait({classify_task}, timeout=self.speculation_delay)
+                    if not done:
+                        speculative = DeltaPump(self.gpt_service.stream_about_products(message, context))
+                verdict = await classify_task
+                timing["classify_ms"] = _elapsed_ms(started)
+                yield "verdict", verdict.dict()
+
+                if verdict.status == "fallback":
+                    if speculative is not None:
+                        await speculative.cancel()
+                        speculation = "cancelled"
+                    yield "done", self._done("fallback", None, speculation, timing, started)
+                    return
+
+                required = set(verdict.required_context)
+                narrowed = [product for product in products if _product_field(product, "title") in required]
+                if speculative is not None and len(products) - len(narrowed) <= self.keep_extra_products:
+                    stream, speculative, speculation = speculative, None, "kept"
+                else:
+                    if speculative is not None:
+                        await speculative.cancel()
+                        speculation = "restarted"
+                    narrowed_context = {**context, "products": narrowed}
+                    stream = DeltaPump(self.gpt_service.stream_about_products(message, narrowed_context))
+            else:
+                stream = DeltaPump(self.gpt_service.stream_about_products(message, context))
+
+            parts: List[str] = []
+            async for delta in stream.read():
+                if not parts:
+                    timing["first_delta_ms"] = _elapsed_ms(started)
+                parts.append(delta)
+                yield "delta", {"delta": delta}
+            yield "done", self._done("ok", "".join(parts).strip(), speculation, timing, started)
+        finally:
+            if classify_task is not None and not classify_task.done():
+                classify_task.cancel()
+            for pump in (speculative, stream):
+                if pump is not None:
+                    await pump.cancel()
+
+    async def _classify(self, message: str, products: List[Any]) -> ClassifyResponse:
+        classify_products = [
+            ClassifyProduct(
+                title=_product_field(product, "title"),
+                description=_product_field(product, "description") or ""
+            )
+            for product in products
+        ]
+        try:
+            return await self.classify_service.classify(message, classify_products)
+        except Exception as e:
+            # Answering with every product beats failing the whole answer
+            logger.warning(f"Classify failed, answering with the full context: {str(e)}")
+            log_fields(answer_classify_error=str(e))
+            return ClassifyResponse(status="ok", required_context=[product.title for product in classify_products])
+
+    def _done(
+        self,
+        status: str,
+        reply: Optional[str],
+        speculation: str,
+        timing: Dict[str, float],
+        started: float
+    ) -> Dict[str, Any]:
+        timing["total_ms"] = _elapsed_ms(started)
+        log_fields(
+            answer_status=status,
+            answer_speculation=speculation,
+            **{f"answer_{key}": value for key, value in timing.items()}
+        )
+        return {"status": status, "reply": reply, "speculation": speculation, "timing": timing}
+
+@lru_cache()
+def get_answer_service() -> AnswerService:
+    """Return the process-wide AnswerService, creating it on first use."""
+    settings = get_settings()
+    return AnswerService(
+        get_gpt_service(),
+        get_classify_service(),
+        speculate=settings.answer_speculate,
+        speculation_delay=settings.answer_speculation_delay_ms / 1000.0,
+        keep_extra_products=settings.answer_keep_extra_products
+    )
@@ -0,0 +1,493 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..models.schemas import Product
+from ..models.product_model import encode_product, normalize_product
+from ..utils.metrics import track_upstream
+from .catalog_store import PostingIndex, load_snapshot, published_identity, save_snapshot
+
+logger = logging.getLogger(__name__)
+
+IndexFields = Dict[str, str]
+
+def _content_version(encoded: Sequence[Any], fields: List[IndexFields]) -> str:
+    """
+    Content hash of the served catalog: the product JSON and the filterable
+    fields, so it changes exactly when some search response could.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for product_json, product_fields in zip(encoded, fields):
+        digest.update(product_json)
+        digest.update(json.dumps(product_fields, sort_keys=True).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def _index_fields(payload: Dict[str, Any]) -> IndexFields:
+    return {key: value for key, value in payload.items() if isinstance(value, str)}
+
+def _intersect(postings: List[Sequence[int]]) -> Sequence[int]:
+    """
+    Positions present in every sorted posting. Walks the first (smallest)
+    posting and binary-searches the others, each from where it last matched.
+    """
+    smallest, others = postings[0], postings[1:]
+    if not others:
+        return smallest
+    matched = []
+    starts = [0] * len(others)
+    for position in smallest:
+        for i, posting in enumerate(others):
+            starts[i] = bisect_left(posting, position, starts[i])
+            if starts[i] == len(posting) or posting[starts[i]] != position:
+                break
+        else:
+            matched.append(position)
+    return matched
+
+class LazyProducts(Sequence):
+    """Products parsed from their encoded JSON on first access, for restored snapshots."""
+
+    def __init__(self, encoded: Sequence[Any]):
+        self._encoded = encoded
+        self._products: List[Optional[Product]] = [None] * len(encoded)
+
+    def __len__(self) -> int:
+        return len(self._encoded)
+
+    def __getitem__(self, position: int) -> Product:
+        product = self._products[position]
+        if product is None:
+            product = self._products[position] = Product.parse_raw(bytes(self._encoded[position]))
+        return product
+
+class PositionView(Sequence):
+    """The items of a sequence at the given positions, fetched on access."""
+
+    def __init__(self, items: Sequence[Any], positions: Sequence[int]):
+        self._items = items
+        self._positions = positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, index: int) -> Any:
+        return self._items[self._positions[index]]
+
+class CatalogSnapshot:
+    """
+    Immutable, indexed view of the product catalog.
+
+    Products are kept in collection scroll order, each alongside its
+    pre-encoded JSON. Every string payload field is indexed as
+    field -> value -> sorted positions (compact uint32 arrays), so matching
+    a set of filters is an intersection of postings rather than a scan.
+    """
+
+    def __init__(self, payloads: Iterable[Dict[str, Any]], points_count: Optional[int] = None):
+        products: List[Product] = []
+        fields: List[IndexFields] = []
+        skipped = 0
+
+        for payload in payloads:
+            try:
+                product = normalize_product(payload)
+            except ValueError as e:
+                skipped += 1
+                logger.warning(f"Skipping catalog point: {str(e)}")
+                continue
+            products.append(product)
+            fields.append(_index_fields(payload))
+
+        encoded = [encode_product(product) for product in products]
+        self._build(
+            products,
+            encoded,
+            fields,
+            skipped=skipped,
+            points_count=points_count if points_count is not None else len(products) + skipped,
+            version=_content_version(encoded, fields),
+            loaded_at=time.time()
+        )
+
+    @classmethod
+    def restore(
+        cls,
+        encoded: Sequence[Any],
+        fields: List[IndexFields],
+        skipped: int,
+        points_count: int,
+        version: str,
+        loaded_at: float,
+        index: Optional[PostingIndex] = None
+    ) -> "CatalogSnapshot":
+        """
+        Rebuild a snapshot from persisted records without normalizing them
+        again. `encoded`, `fields` and `index` may be zero-copy views into a
+        memory-mapped file; Product objects are parsed only when a page
+        needs them.
+        """
+        snapshot = cls.__new__(cls)
+        snapshot._build(LazyProducts(encoded), encoded, fields, skipped, points_count, version, loaded_at, index)
+        return snapshot
+
+    def _build(
+        self,
+        products: Sequence[Product],
+        encoded: Sequence[Any],
+        fields: List[IndexFields],
+        skipped: int,
+        points_count: int,
+        version: str,
+        loaded_at: float,
+        index: Optional[PostingIndex] = None
+    ) -> None:
+        if index is None:
+            positions_by_value: Dict[str, Dict[str, List[int]]] = {}
+            for position, product_fields in enumerate(fields):
+                for key, value in product_fields.items():
+                    positions_by_value.setdefault(key, {}).setdefault(value, []).append(position)
+            index = {
+                key: {value: array("I", positions) for value, positions in values.items()}
+                for key, values in positions_by_value.items()
+            }
+
+        self.products = products
+        self.encoded = encoded
+        self.fields = fields
+        self.version = version
+        self.skipped = skipped
+        self.points_count = points_count
+        self.loaded_at = loaded_at
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def match(self, filters: Optional[Dict[str, str]] = None) -> Sequence[int]:
+        """
+        Return the positions of products whose payload matches every filter,
+        in catalog order, as a read-only sequence (a range or posting view
+        where possible, so nothing is copied per request).
+        """
+        if not filters:
+            return range(len(self.products))
+
+        postings = []
+        for key, value in filters.items():
+            posting = self._index.get(key, {}).get(value)
+            if not posting:
+                return []
+            postings.append(posting)
+
+        postings.sort(key=len)
+        return _intersect(postings)
+
+    def postings(self) -> Iterator[Tuple[str, str, Sequence[int]]]:
+        """Every (field, value, sorted positions) entry of the filter index."""
+        for key, values in self._index.items():
+            for value, positions in values.items():
+                yield key, value, positions
+
+    def page(
+        self,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> Tuple[Sequence[int], Optional[int]]:
+        """
+        Return the positions of up to `limit` matching products starting at
+        `offset`, and the offset of the next page (None when there are no more matches).
+        """
+        positions = self.match(filters)
+        end = offset + limit
+        next_offset = end if end < len(positions) else None
+        return positions[offset:end], next_offset
+
+    def query(
+        self,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> Tuple[List[Product], Optional[int]]:
+        """
+        Return up to `limit` matching products starting at `offset`, and the
+        offset of the next page (None when there are no more matches).
+        """
+        positions, next_offset = self.page(filters, limit, offset)
+        return [self.products[position] for position in positions], next_offset
+
+class EncodedProductCache:
+    """
+    LRU of normalized, pre-encoded products keyed by point ID, for pages
+    fetched from Qdrant per request. An entry is reused only while the
+    point's payload is unchanged, which is far cheaper to check than
+    normalizing and encoding the product again.
+
+    Thread-safe: pages are fetched on the Qdrant executor, often several at once.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Tuple[Dict[str, Any], Product, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, point_id: Any, payload: Dict[str, Any]) -> Tuple[Product, bytes]:
+        """
+        Raises:
+            ValueError: If the payload is not a valid product.
+        """
+        with self._lock:
+            entry = self._entries.get(point_id)
+            if entry is not None and entry[0] == payload:
+                self._entries.move_to_end(point_id)
+                return entry[1], entry[2]
+
+        # Normalized outside the lock; a concurrent miss for the same point just does it twice
+        product = normalize_product(payload)
+        encoded = encode_product(product)
+        with self._lock:
+            self._entries[point_id] = (payload, product, encoded)
+            self._entries.move_to_end(point_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return product, encoded
+
+class CatalogService:
+    """
+    Keeps an in-memory CatalogSnapshot of a Qdrant collection.
+
+    The snapshot is loaded once and refreshed by a background thread, either
+    when the collection's point count changes or after `refresh_interval`
+    seconds. New snapshots are built off to the side and swapped in with a
+    single reference assignment, so readers never see a partial catalog.
+
+    With a `snapshot_path`, every new catalog version is also persisted to
+    disk, and a restarted worker can serve the persisted snapshot before
+    Qdrant has answered; the refresh thread then reconciles it with Qdrant.
+
+    With `source="shared"` the service never reads Qdrant. It maps the
+    snapshot a catalog loader process publishes at `snapshot_path`,
+    read-only, and a watcher thread swaps in each new generation, so any
+    number of workers share one copy of the catalog and one loader's
+    Qdrant traffic.
+    """
+
+    def __init__(
+        self,
+        client,
+        collection_name: str,
+        refresh_interval: float = 300.0,
+        check_interval: float = 30.0,
+        page_size: int = 256,
+        snapshot_path: Optional[str] = None,
+        source: str = "qdrant",
+        watch_interval: float = 1.0
+    ):
+        if source == "shared" and not snapshot_path:
+            raise ValueError("A shared catalog needs a snapshot path")
+        self.client = client
+        self.collection_name = collection_name
+        self.refresh_interval = refresh_interval
+        self.check_interval = check_interval
+        self.page_size = page_size
+        self.snapshot_path = snapshot_path
+        self.source = source
+        self.watch_interval = watch_interval
+
+        self._snapshot: Optional[CatalogSnapshot] = None
+        # Version and generation of the snapshot on disk, and whether Qdrant
+        # has been read since startup
+        self._persisted_version: Optional[str] = None
+        self._generation = 0
+        self._published: Optional[Tuple[int, int]] = None
+        self._synced = False
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        The current snapshot, loading it synchronously if nothing has been loaded yet.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._load_lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self._load()
+        return snapshot
+
+    def restore(self) -> bool:
+        """
+        Serve the snapshot persisted on disk, if there is one for this
+        collection. Returns whether a snapshot was restored. No network I/O.
+        """
+        if not self.snapshot_path:
+            return False
+        with self._load_lock:
+            if self._snapshot is None:
+                return self._attach() is not None
+        return False
+
+    def _attach(self) -> Optional[CatalogSnapshot]:
+        """
+        Map the snapshot on disk and serve it, if there is one for this
+        collection. Call with the load lock held.
+        """
+        started = time.monotonic()
+        identity = published_identity(self.snapshot_path)
+        persisted = load_snapshot(self.snapshot_path, self.collection_name)
+        self._published = identity
+        if persisted is None:
+            return None
+        if self._snapshot is not None and (persisted.generation, persisted.version) == (
+            self._generation, self._persisted_version
+        ):
+            # Already serving it; the file was touched, or replaced while we read it
+            return None
+        if self._snapshot is not None and persisted.generation <= self._generation:
+            # The file was replaced without continuing the sequence, e.g. deleted
+            # and republished by a fresh loader; it is still the newest catalog
+            logger.warning(
+                f"Catalog snapshot generation went from {self._generation} to {persisted.generation} "
+                f"at {self.snapshot_path}; serving the republished snapshot"
+            )
+        snapshot = CatalogSnapshot.restore(
+            persisted.encoded,
+            persisted.fields,
+            skipped=persisted.skipped,
+            points_count=persisted.points_count,
+            version=persisted.version,
+            loaded_at=persisted.loaded_at,
+            index=persisted.index
+        )
+        self._snapshot = snapshot
+        self._persisted_version = snapshot.version
+        self._generation = persisted.generation
+        logger.info(
+            f"Mapped catalog snapshot {snapshot.version} (generation {persisted.generation}) "
+            f"from {self.snapshot_path}: {len(snapshot)} products in {time.monotonic() - started:.3f}s"
+        )
+        return snapshot
+
+    def refresh(self) -> CatalogSnapshot:
+        """
+        Reload the catalog (from Qdrant, or the published snapshot for a
+        shared catalog) and swap the new snapshot in.
+        """
+        with self._load_lock:
+            return self._load()
+
+    def _load(self) -> CatalogSnapshot:
+        if self.source == "shared":
+            snapshot = self._attach() or self._snapshot
+            if snapshot is None:
+                raise RuntimeError(f"No catalog snapshot has been published at {self.snapshot_path} yet")
+            return snapshot
+
+        started = time.monotonic()
+        with track_upstream("qdrant", "catalog_load"):
+            points_count = self._points_count()
+            payloads = self._fetch_payloads()
+        snapshot = CatalogSnapshot(payloads, points_count=points_count)
+        self._snapshot = snapshot
+        self._synced = True
+        logger.info(
+            f"Loaded catalog snapshot {snapshot.version}: {len(snapshot)} products "
+            f"({snapshot.skipped} skipped) in {time.monotonic() - started:.2f}s"
+        )
+        self._persist(snapshot)
+        return snapshot
+
+    def _persist(self, snapshot: CatalogSnapshot) -> None:
+        if not self.snapshot_path or snapshot.version == self._persisted_version:
+            return
+        try:
+            save_snapshot(snapshot, self.snapshot_path, self.collection_name, generation=self._generation + 1)
+            self._persisted_version = snapshot.version
+            self._generation += 1
+        except Exception as e:
+            logger.warning(f"Could not persist catalog snapshot to {self.snapshot_path}: {str(e)}")
+
+    def _points_count(self) -> int:
+        return self.client.get_collection(self.collection_name).points_count
+
+    def _fetch_payloads(self) -> List[Dict[str, Any]]:
+        payloads: List[Dict[str, Any]] = []
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=self.page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            payloads.extend(point.payload or {} for point in points)
+            if offset is None:
+                return payloads
+
+    def start(self) -> None:
+        """
+        Start the background refresh thread. The first snapshot is loaded immediately.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        if self.source == "shared":
+            self._thread = threading.Thread(target=self._watch, name="catalog-watch", daemon=True)
+        else:
+            self._thread = threading.Thread(target=self._run, name="catalog-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        # A snapshot restored from disk is reconciled with Qdrant straight away
+        next_full_refresh = time.monotonic() + self.refresh_interval if self._synced else 0.0
+        wait = 0.0
+        while not self._stop.wait(wait):
+            wait = self.check_interval
+            try:
+                current = self._snapshot
+                if (
+                    current is not None
+                    and time.monotonic() < next_full_refresh
+                    and self._points_count() == current.points_count
+                ):
+                    continue
+                self.refresh()
+                next_full_refresh = time.monotonic() + self.refresh_interval
+            except Exception as e:
+                logger.warning(f"Catalog refresh failed, keeping previous snapshot: {str(e)}", exc_info=True)
+
+    def _watch(self) -> None:
+        # A stat per interval; the file is only mapped again once the loader replaces it
+        while not self._stop.wait(self.watch_interval):
+            try:
+                if published_identity(self.snapshot_path) == self._published:
+                    continue
+                # Any replacement counts, even one whose generation went backwards
+                with self._load_lock:
+                    self._attach()
+            except Exception as e:
+                logger.warning(f"Catalog watch failed, keeping previous snapshot: {str(e)}", exc_info=True)
@@ -0,0 +1,235 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BSCATLG\0"
+FORMAT_VERSION = 2
+
+# magic, format version, generation, products, points count, skipped,
+# loaded_at, catalog version (16 hex chars), collection name length, then
+# the offset and length of the postings array and of the index directory
+_HEADER = struct.Struct("<8sIQIIId16sIQQQQ")
+
+# field -> value -> sorted product positions
+PostingIndex = Dict[str, Dict[str, Sequence[int]]]
+
+class PersistedCatalog(NamedTuple):
+    # Zero-copy views of each product's encoded JSON
+    encoded: Sequence[memoryview]
+    fields: Sequence[Dict[str, str]]
+    # Posting arrays viewed straight from the mapping
+    index: PostingIndex
+    skipped: int
+    points_count: int
+    version: str
+    loaded_at: float
+    generation: int
+
+class MappedRecords(Sequence):
+    """
+    One column of a mapped snapshot's records (product JSON or fields),
+    sliced out of the mapping on access, so the table costs no memory
+    per product in the processes that read it.
+    """
+
+    def __init__(self, data: memoryview, offsets: memoryview, column: int):
+        self._data = data
+        self._offsets = offsets
+        self._column = column
+
+    def __len__(self) -> int:
+        return (len(self._offsets) - 1) // 2
+
+    def __getitem__(self, position: int) -> memoryview:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("record position out of range")
+        start = 2 * position + self._column
+        return self._data[self._offsets[start]:self._offsets[start + 1]]
+
+class MappedFields(MappedRecords):
+    """The filterable fields column, decoded from JSON on access."""
+
+    def __getitem__(self, position: int) -> Dict[str, str]:
+        return json.loads(bytes(super().__getitem__(position)))
+
+def _align(position: int, alignment: int = 8) -> int:
+    return -position % alignment
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def save_snapshot(snapshot: Any, path: str, collection_name: str, generation: int = 0) -> None:
+    """
+    Write a snapshot as a compact binary file: a fixed header, the
+    collection name, a table of record offsets, then per product its
+    encoded JSON followed by its filterable fields as JSON, and finally the
+    filter index as one array of uint32 positions plus a small directory.
+
+    The file is written to a temporary name and renamed into place, so
+    readers (including other workers) never see a partial snapshot.
+    `generation` should grow with every snapshot published to `path`.
+    """
+    collection = collection_name.encode("utf-8")
+    records = []
+    for product_json, fields in zip(snapshot.encoded, snapshot.fields):
+        records.append(bytes(product_json))
+        records.append(json.dumps(fields, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+    offsets = array("Q", [0])
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    postings = array("I")
+    index_directory: Dict[str, Dict[str, Tuple[int, int]]] = {}
+    for key, value, positions in snapshot.postings():
+        index_directory.setdefault(key, {})[value] = (len(postings), len(positions))
+        postings.extend(positions)
+    directory_json = json.dumps(index_directory, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    # Both arrays are 8-byte aligned so readers can view them in place
+    offsets_start = _HEADER.size + len(collection)
+    offsets_start += _align(offsets_start)
+    records_end = offsets_start + len(offsets) * offsets.itemsize + offsets[-1]
+    postings_start = records_end + _align(records_end)
+    directory_start = postings_start + len(postings) * postings.itemsize
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                generation,
+                len(snapshot.encoded),
+                snapshot.points_count,
+                snapshot.skipped,
+                snapshot.loaded_at,
+                snapshot.version.encode("ascii")[:16].ljust(16, b"\0"),
+                len(collection),
+                postings_start,
+                len(postings),
+                directory_start,
+                len(directory_json)
+            ))
+            f.write(collection)
+            f.write(b"\0" * (offsets_start - _HEADER.size - len(collection)))
+            f.write(_little_endian(offsets))
+            for record in records:
+                f.write(record)
+            f.write(b"\0" * (postings_start - records_end))
+            f.write(_little_endian(postings))
+            f.write(directory_json)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+def load_snapshot(path: str, collection_name: str) -> Optional[PersistedCatalog]:
+    """
+    Memory-map a snapshot written by `save_snapshot`, read-only. Product
+    JSON, fields and the filter index are all served straight from the
+    mapping, so processes mapping the same file share its pages; only the
+    small index directory is parsed.
+
+    Returns None if there is no usable snapshot for this collection.
+    """
+    if sys.byteorder != "little":
+        logger.warning("Catalog snapshots can only be mapped on little-endian hosts")
+        return None
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Missing or empty file
+        return None
+
+    try:
+        persisted = _read(mapped, path, collection_name)
+    except (struct.error, TypeError, UnicodeDecodeError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable catalog snapshot {path}: {str(e)}")
+        persisted = None
+    if persisted is None:
+        try:
+            mapped.close()
+        except BufferError:
+            # A view is still referenced; the mapping is released with it
+            pass
+    # Otherwise the memoryviews keep the mapping alive for as long as the snapshot is served
+    return persisted
+
+def _read(mapped: mmap.mmap, path: str, collection_name: str) -> Optional[PersistedCatalog]:
+    if len(mapped) < _HEADER.size:
+        logger.warning(f"Ignoring catalog snapshot {path}: truncated")
+        return None
+    (
+        magic, format_version, generation, count, points_count, skipped, loaded_at, version,
+        name_length, postings_start, postings_count, directory_start, directory_length
+    ) = _HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        logger.warning(f"Ignoring catalog snapshot {path}: unsupported format")
+        return None
+    position = _HEADER.size
+    if mapped[position:position + name_length].decode("utf-8") != collection_name:
+        logger.info(f"Ignoring catalog snapshot {path}: written for another collection")
+        return None
+    position += name_length
+    position += _align(position)
+
+    view = memoryview(mapped)
+    offsets_end = position + 8 * (2 * count + 1)
+    if directory_start + directory_length != len(mapped) or offsets_end > postings_start:
+        logger.warning(f"Ignoring catalog snapshot {path}: truncated")
+        return None
+    offsets = view[position:offsets_end].cast("Q")
+    if offsets_end + offsets[-1] > postings_start:
+        logger.warning(f"Ignoring catalog snapshot {path}: truncated")
+        return None
+
+    data = view[offsets_end:offsets_end + offsets[-1]]
+    postings = view[postings_start:postings_start + 4 * postings_count].cast("I")
+    directory = json.loads(bytes(view[directory_start:directory_start + directory_length]))
+    index: PostingIndex = {
+        key: {value: postings[start:start + length] for value, (start, length) in values.items()}
+        for key, values in directory.items()
+    }
+    return PersistedCatalog(
+        encoded=MappedRecords(data, offsets, 0),
+        fields=MappedFields(data, offsets, 1),
+        index=index,
+        skipped=skipped,
+        points_count=points_count,
+        version=version.rstrip(b"\0").decode("ascii"),
+        loaded_at=loaded_at,
+        generation=generation
+    )
+
+def published_identity(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Cheap change check for a published snapshot: its inode and mtime, which
+    change on every atomic replace. None if nothing is published.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from ..config import get_settings
+from ..models.schemas import ClassifyProduct, ClassifyResponse
+from ..utils.cache import ResultCache, create_cache_backend
+from ..utils.metrics import cached_prompt_tokens
+from ..utils.profiling import phase
+from ..utils.request_log import log_fields, log_payload
+from ..utils.singleflight import SingleFlight
+from .gpt_service import GPTService, get_gpt_service
+from .local_classifier import LocalClassifier, LocalVerdict
+from .upstream import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the prompt or output format changes, so cached verdicts don't outlive it
+CLASSIFY_PROMPT_VERSION = 2
+
+# Longest product description included in the product table
+CLASSIFY_DESCRIPTION_CHARS = 240
+
+# Output token cap: room for the JSON envelope plus every product number, in
+# case all of them are relevant. Latency follows the tokens generated, not the cap
+CLASSIFY_BASE_TOKENS = 20
+CLASSIFY_TOKENS_PER_PRODUCT = 3
+CLASSIFY_MAX_TOKENS = 300
+
+# Identical on every call, so it forms a stable prefix for provider-side prompt caching
+CLASSIFY_SYSTEM_PROMPT = """You are a product classification assistant for a supplement company. Decide which of the listed products (if any) are needed to answer the user's question.
+
+The user message contains a numbered product table ("number | title | description") followed by the question.
+
+Rules:
+- If the question is about medications, health conditions or medical advice, return fallback
+- If the question is not about our products or ingredients, return fallback
+- If it's a thank you or general conversation, return fallback
+- For comparison questions, include all relevant products
+- For ingredient questions, include products containing those ingredients
+- For health benefit questions, include products that address those benefits
+- Only use numbers that appear in the product table
+
+Respond with JSON only, in exactly this format:
+{"status": "ok" | "fallback", "products": [<product numbers>]}
+
+Examples (with a table listing 1 | Bone Health Plus, 2 | GI Revive, 3 | CogniAid™, 4 | Brain Boost):
+- "What product has calcium?" -> {"status": "ok", "products": [1]}
+- "Can I take this with my blood pressure meds?" -> {"status": "fallback", "products": []}
+- "What's the difference between your brain supplements?" -> {"status": "ok", "products": [3, 4]}
+- "Thank you for your help!" -> {"status": "fallback", "products": []}
+- "Do you have anything for digestion?" -> {"status": "ok", "products": [2]}"""
+
+def _compact(text: str, max_chars: int) -> str:
+    text = " ".join(text.split()).replace("|", "/")
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+@lru_cache(maxsize=512)
+def _product_table(products: Tuple[Tuple[str, str], ...]) -> str:
+    """Numbered product table. Memoized per product set, which repeats across questions."""
+    return "\n".join(
+        f"{number} | {_compact(title, 120)} | {_compact(description, CLASSIFY_DESCRIPTION_CHARS)}"
+        for number, (title, description) in enumerate(products, start=1)
+    )
+
+def build_classify_messages(message: str, products: List[ClassifyProduct]) -> List[Dict[str, str]]:
+    """
+    Build the classifier messages: the static system prompt, then the
+    variable part (product table and question) as the user turn.
+    """
+    table = _product_table(tuple((p.title, p.description) for p in products))
+    return [
+        {"role": "system", "content": CLASSIFY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Products:\n{table}\n\nQuestion: {json.dumps(message, ensure_ascii=False)}"}
+    ]
+
+def classify_max_tokens(products: List[ClassifyProduct]) -> int:
+    """Output token budget large enough to list every product's number."""
+    return min(CLASSIFY_MAX_TOKENS, CLASSIFY_BASE_TOKENS + CLASSIFY_TOKENS_PER_PRODUCT * len(products))
+
+def parse_classify_output(raw_content: str, products: List[ClassifyProduct]) -> ClassifyResponse:
+    """
+    Map the model's product numbers back to titles.
+
+    Raises:
+        ValueError: If the output is not the expected JSON shape.
+    """
+    parsed = json.loads(raw_content)
+    if not isinstance(parsed, dict):
+        raise ValueError("Malformed response from GPT")
+    status = parsed.get("status")
+    numbers = parsed.get("products", [])
+    if status not in ("ok", "fallback") or not isinstance(numbers, list):
+        raise ValueError("Malformed response from GPT")
+
+    required_context: List[str] = []
+    for number in numbers:
+        # Numbers outside the table are dropped rather than trusted
+        if isinstance(number, int) and not isinstance(number, bool) and 1 <= number <= len(products):
+            title = products[number - 1].title
+            if title not in required_context:
+                required_context.append(title)
+    if status == "fallback":
+        required_context = []
+    return ClassifyResponse(status=status, required_context=required_context)
+
+def classify_cache_key(model: str, message: str, products: List[ClassifyProduct]) -> str:
+    """
+    Cache key for a classification: the normalized message plus a hash of the
+    product titles and descriptions, scoped to the model.
+    """
+    normalized_message = " ".join(message.lower().split())
+    catalog = sorted((p.title, p.description) for p in products)
+    digest = hashlib.sha256(
+        json.dumps([normalized_message, catalog], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f"{model}:v{CLASSIFY_PROMPT_VERSION}:{digest}"
+
+class ClassifyService:
+    """
+    Decides which of the supplied products (if any) are needed to answer a
+    user question, caching verdicts since classification runs at temperature 0.
+    """
+
+    def __init__(
+        self,
+        gpt_service: GPTService,
+        cache: ResultCache,
+        local_classifier: Optional[LocalClassifier] = None,
+        fastpath_mode: str = "off",
+        fastpath_threshold: float = 0.9,
+        json_mode: bool = True
+    ):
+        self.gpt_service = gpt_service
+        self.cache = cache
+        self.local_classifier = local_classifier or LocalClassifier()
+        self.fastpath_mode = fastpath_mode
+        self.fastpath_threshold = fastpath_threshold
+        self.json_mode = json_mode
+        self.fastpath_hits = 0
+        self.shadow_compared = 0
+        self.shadow_agreed = 0
+        self._flights = SingleFlight()
+
+    async def classify(self, message: str, products: List[ClassifyProduct]) -> ClassifyResponse:
+        verdict = None
+        if self.fastpath_mode in ("on", "shadow"):
+            with phase("fastpath"):
+                verdict = self.local_classifier.classify(message, products)
+            if (
+                self.fastpath_mode == "on"
+                and verdict is not None
+                and verdict.confidence >= self.fastpath_threshold
+            ):
+                self.fastpath_hits += 1
+                log_fields(classify_source="fastpath", fastpath_rule=verdict.rule, classify_status=verdict.status)
+                return ClassifyResponse(status=verdict.status, required_context=verdict.required_context)
+
+        try:
+            result = await self._classify_cached(message, products)
+        except CircuitOpen:
+            return self._degraded(message, products, verdict)
+        log_fields(classify_status=result.status)
+        if self.fastpath_mode == "shadow" and verdict is not None:
+            self._record_shadow(verdict, result)
+        return result
+
+    def _degraded(
+        self,
+        message: str,
+        products: List[ClassifyProduct],
+        verdict: Optional[LocalVerdict]
+    ) -> ClassifyResponse:
+        """
+        Deterministic verdict while OpenAI's circuit is open: the local
+        classifier's answer whatever its confidence, otherwise fallback.
+        Never cached, so GPT verdicts take over once the circuit closes.
+        """
+        if verdict is None:
+            verdict = self.local_classifier.classify(message, products)
+        if verdict is None:
+            result = ClassifyResponse(status="fallback", required_context=[])
+        else:
+            result = ClassifyResponse(status=verdict.status, required_context=verdict.required_context)
+        log_fields(classify_source="degraded", classify_status=result.status)
+        return result
+
+    async def _classify_cached(self, message: str, products: List[ClassifyProduct]) -> ClassifyResponse:
+        key = classify_cache_key(self.gpt_service.model, message, products)
+        # Identical concurrent questions share one cache lookup and GPT call
+        return await self._flights.do(key, lambda: self._lookup_or_classify(key, message, products))
+
+    async def _lookup_or_classify(self, key: str, message: str, products: List[ClassifyProduct]) -> ClassifyResponse:
+        with phase("cache", "classify"):
+            cached = await self.cache.get(key)
+        if cached is not None:
+            log_fields(classify_source="cache")
+            return ClassifyResponse(**cached)
+
+        result = await self._classify_with_gpt(message, products)
+        await self.cache.set(key, result.dict())
+        return result
+
+    def _record_shadow(self, verdict: LocalVerdict, result: ClassifyResponse) -> None:
+        agreed = verdict.status == result.status and (
+            result.status == "fallback" or set(verdict.required_context) == set(result.required_context)
+        )
+        self.shadow_compared += 1
+        self.shadow_agreed += agreed
+        log_fields(
+            shadow_rule=verdict.rule,
+            shadow_confidence=round(verdict.confidence, 2),
+            shadow_local=[verdict.status, verdict.required_context],
+            shadow_agreed=agreed
+        )
+
+    async def _classify_with_gpt(self, message: str, products: List[ClassifyProduct]) -> ClassifyResponse:
+        extra = {"response_format": {"type": "json_object"}} if self.json_mode else {}
+        gpt_response = await self.gpt_service.complete(
+            build_classify_messages(message, products),
+            temperature=0,
+            max_tokens=classify_max_tokens(products),
+            timeout=10,
+            endpoint="classify",
+            **extra
+        )
+        usage = getattr(gpt_response, "usage", None)
+        if usage is not None:
+            log_fields(
+                classify_prompt_tokens=usage.prompt_tokens,
+                classify_completion_tokens=usage.completion_tokens,
+                classify_cached_tokens=cached_prompt_tokens(usage)
+            )
+        raw_content = gpt_response.choices[0].message.content.strip()
+        log_payload(gpt_output=raw_content)
+        with phase("classify_parse"):
+            result = parse_classify_output(raw_content, products)
+        log_fields(classify_source="gpt")
+        return result
+
+@lru_cache()
+def get_classify_service() -> ClassifyService:
+    """Return the process-wide ClassifyService, creating it on first use."""
+    settings = get_settings()
+    backend = create_cache_backend(
+        settings.classify_cache_backend,
+        max_entries=settings.classify_cache_size,
+        redis_url=settings.redis_url
+    )
+    cache = ResultCache(backend, ttl=settings.classify_cache_ttl, namespace="classify")
+    return ClassifyService(
+        get_gpt_service(),
+        cache,
+        fastpath_mode=settings.classify_fastpath_mode,
+        fastpath_threshold=settings.classify_fastpath_threshold,
+        json_mode=settings.classify_json_mode
+    )
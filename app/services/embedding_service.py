@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+from ..config import get_settings
+from ..utils.metrics import CACHE_LOOKUPS, EMBEDDING_BATCH_SIZE, record_token_usage
+from .gpt_service import GPTService, get_gpt_service
+from .local_classifier import tokenize
+
+Vector = List[float]
+
+class EmbeddingProvider:
+    """Turns a batch of texts into vectors, one per text and in the same order."""
+
+    async def embed(self, texts: List[str]) -> List[Vector]:
+        raise NotImplementedError
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings API calls made through the GPT service's scheduler and connection pool."""
+
+    def __init__(self, gpt_service: GPTService, model: str, dimensions: Optional[int] = None):
+        self.gpt_service = gpt_service
+        self.model = model
+        self.dimensions = dimensions
+
+    async def embed(self, texts: List[str]) -> List[Vector]:
+        extra = {"dimensions": self.dimensions} if self.dimensions else {}
+        deadline = time.monotonic() + self.gpt_service.deadline
+        response = await self.gpt_service.scheduler.call(
+            lambda remaining: self.gpt_service.client.embeddings.create(
+                model=self.model,
+                input=texts,
+                timeout=remaining,
+                **extra
+            ),
+            deadline,
+            operation="embeddings"
+        )
+        record_token_usage("embeddings", getattr(response, "usage", None))
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def hashing_embedding(text: str, dimensions: int = 256) -> Vector:
+    """
+    Deterministic bag-of-words embedding: unigrams and bigrams hashed into
+    `dimensions` signed buckets, L2-normalized. Stable across processes.
+    """
+    tokens = tokenize(text)
+    vector = [0.0] * dimensions
+    for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        vector[digest % dimensions] += 1.0 if digest >> 63 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Local stand-in for tests and benchmarks; no network and no cost."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    async def embed(self, texts: List[str]) -> List[Vector]:
+        return [hashing_embedding(text, self.dimensions) for text in texts]
+
+class EmbeddingBatcher:
+    """
+    Micro-batches concurrent embedding requests.
+
+    The first text to arrive opens a batch that is flushed after `window`
+    seconds, or as soon as it holds `max_batch` distinct texts, as a single
+    provider call. Identical texts in the same batch share one result.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, window: float = 0.005, max_batch: int = 64):
+        self.provider = provider
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[str, "asyncio.Future[Vector]"] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    async def embed(self, text: str) -> Vector:
+        future = self._pending.get(text)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[text] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window, self._flush)
+        # A cancelled caller must not cancel the result other callers share
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, "asyncio.Future[Vector]"]) -> None:
+        texts = list(batch)
+        EMBEDDING_BATCH_SIZE.observe((), len(texts))
+        try:
+            vectors = await self.provider.embed(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, vector in zip(texts, vectors):
+            future = batch[text]
+            if not future.done():
+                future.set_result(vector)
+
+class EmbeddingService:
+    """
+    Query embeddings for semantic search: an in-process LRU of recent query
+    vectors in front of a micro-batching provider.
+    """
+
+    def __init__(self, batcher: EmbeddingBatcher, cache_size: int = 4096):
+        self.batcher = batcher
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Vector]" = OrderedDict()
+
+    async def embed_query(self, text: str) -> Vector:
+        key = " ".join(text.lower().split())
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            CACHE_LOOKUPS.inc(("embedding", "hit"))
+            return vector
+
+        CACHE_LOOKUPS.inc(("embedding", "miss"))
+        vector = await self.batcher.embed(key)
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return vector
+
+def create_embedding_provider(kind: str, model: str, dimensions: Optional[int] = None) -> EmbeddingProvider:
+    """
+    Build an embedding provider from settings: "openai" (default) or "hashing".
+    """
+    if (kind or "openai").lower() == "hashing":
+        return HashingEmbeddingProvider(dimensions or 256)
+    return OpenAIEmbeddingProvider(get_gpt_service(), model, dimensions)
+
+@lru_cache()
+def get_embedding_service() -> EmbeddingService:
+    """Return the process-wide EmbeddingService, creating it on first use."""
+    settings = get_settings()
+    provider = create_embedding_provider(
+        settings.embedding_provider,
+        settings.embedding_model,
+        settings.embedding_dimensions
+    )
+    batcher = EmbeddingBatcher(
+        provider,
+        window=settings.embedding_batch_window_ms / 1000.0,
+        max_batch=settings.embedding_max_batch
+    )
+    return EmbeddingService(batcher, cache_size=settings.embedding_cache_size)
@@ -1,14 +1,109 @@
-from typing import List, Dict
-import openai
+import logging
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, List, Dict, Optional
 from ..config import get_settings
 from ..models.schemas import Product
-from ..utils.context_formatter import format_context_to_system_prompt
+from ..utils.context_formatter import build_system_prompt
+from ..utils.metrics import record_token_usage
+from ..utils.profiling import phase
+from ..utils.request_log import log_fields
+from ..utils.singleflight import SingleFlight, flight_key
+from .upstream import Overloaded, UpstreamScheduler, create_circuit_breaker
+
+logger = logging.getLogger(__name__)
 
 class GPTService:
     def __init__(self):
+        import httpx
+        import openai
+
         settings = get_settings()
-        self.client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
+        # One tuned connection pool shared by every OpenAI call; retries are
+        # handled by the scheduler, not the SDK
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_concurrency,
+                max_keepalive_connections=settings.openai_max_concurrency,
+                keepalive_expiry=60.0
+            ),
+            timeout=httpx.Timeout(settings.openai_deadline, connect=5.0)
+        )
+        self.client = openai.AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            http_client=self.http_client,
+            max_retries=0
+        )
+        self.scheduler = UpstreamScheduler(
+            "openai",
+            initial_limit=settings.openai_initial_concurrency,
+            max_limit=settings.openai_max_concurrency,
+            slow_call_seconds=settings.openai_slow_call_seconds,
+            max_retries=settings.openai_max_retries,
+            breaker=create_circuit_breaker("openai", settings.openai_slow_call_seconds)
+        )
+        self.deadline = settings.openai_deadline
         self.model = settings.gpt_model
+        self.prompt_token_budget = settings.chat_prompt_token_budget
+        self.ready = False
+        self._flights = SingleFlight()
+
+    async def warmup(self) -> None:
+        """
+        Open a connection to the OpenAI API and check the configured model is available.
+        """
+        await self.client.models.retrieve(self.model)
+        self.ready = True
+
+    async def close(self) -> None:
+        await self.client.close()
+        await self.http_client.aclose()
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        timeout: Optional[float] = None,
+        endpoint: str = "chat",
+        **kwargs: Any
+    ):
+        """
+        Create a chat completion through the shared scheduler.
+
+        Args:
+            messages: Chat messages to send
+            timeout: Overall deadline in seconds, including queueing and retries
+            endpoint: Label for latency and token metrics
+            **kwargs: Extra completion parameters (temperature, max_tokens, ...)
+
+        Raises:
+            Overloaded: If the request can't be started before its deadline
+        """
+        deadline = time.monotonic() + (timeout or self.deadline)
+        with phase("openai", endpoint):
+            response = await self.scheduler.call(
+                lambda remaining: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    timeout=remaining,
+                    **kwargs
+                ),
+                deadline,
+                operation=endpoint
+            )
+        record_token_usage(endpoint, getattr(response, "usage", None))
+        return response
+
+    def _build_messages(self, message: str, context: Dict) -> List[Dict[str, str]]:
+        # Format the context into a budgeted system prompt
+        with phase("prompt"):
+            prompt = build_system_prompt(context, self.prompt_token_budget)
+        log_fields(prompt_tokens_estimate=prompt.estimated_tokens, prompt_trimmed=list(prompt.trimmed))
+
+        return [
+            {"role": "system", "content": prompt.text},
+            {"role": "user", "content": f"Please respond to this message using the context above: {message}"}
+        ]
 
     async def ask_about_products(self, message: str, context: Dict) -> str:
         """
@@ -18,26 +113,67 @@ class GPTService:
             message: The user's message
             context: Dictionary containing products, answers, summary, and chat messages
         """
-        # Format the context into a system prompt
-        system_prompt = format_context_to_system_prompt(context)
+        messages = self._build_messages(message, context)
 
-        # Prepare the messages
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Please respond to this message using the context above: {message}"}
-        ]
+        # Identical concurrent questions share one completion
+        return await self._flights.do(
+            flight_key(self.model, messages),
+            lambda: self._complete_chat(messages)
+        )
 
+    async def _complete_chat(self, messages: List[Dict[str, str]]) -> str:
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
+            response = await self.complete(messages, temperature=0.7, max_tokens=500)
             return response.choices[0].message.content.strip()
+        except Overloaded:
+            raise
         except Exception as e:
             # Log the error in production
             raise Exception(f"Error calling OpenAI API: {str(e)}")
 
-# Create a singleton instance
-gpt_service = GPTService()
+    async def stream_about_products(self, message: str, context: Dict) -> AsyncIterator[str]:
+        """
+        Stream a response about products as text deltas.
+
+        Closing the generator early (e.g. when the client disconnects) closes
+        the upstream HTTP response, which cancels generation on OpenAI's side.
+
+        Args:
+            message: The user's message
+            context: Dictionary containing products, answers, summary, and chat messages
+        """
+        messages = self._build_messages(message, context)
+        deadline = time.monotonic() + self.deadline
+
+        # The scheduler slot is held for the whole stream
+        async with self.scheduler.slot(deadline, operation="chat_stream"):
+            with phase("openai", "chat_stream"):
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=0.7,
+                        max_tokens=500,
+                        stream=True,
+                        timeout=max(0.1, deadline - time.monotonic()),
+                        # Ask for a final usage chunk so streamed tokens are counted too
+                        extra_body={"stream_options": {"include_usage": True}}
+                    )
+                except Exception as e:
+                    raise Exception(f"Error calling OpenAI API: {str(e)}") from e
+
+                try:
+                    async for chunk in stream:
+                        record_token_usage("chat_stream", getattr(chunk, "usage", None))
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            yield delta
+                finally:
+                    await stream.response.aclose()
+
+@lru_cache()
+def get_gpt_service() -> GPTService:
+    """Return the process-wide GPTService, creating it on first use."""
+    return GPTService()
@@ -0,0 +1,174 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from ..models.schemas import ClassifyProduct
+
+# Unicode-aware, so non-Latin messages aren't mistaken for empty ones
+TOKEN_RE = re.compile(r"\w+")
+
+# Messages made up only of these words are small talk and always fall back
+SMALL_TALK_WORDS = frozenset({
+    "thanks", "thank", "you", "thx", "ty", "so", "much", "very", "a", "lot", "ok", "okay",
+    "great", "cool", "nice", "awesome", "perfect", "hi", "hello", "hey", "bye", "goodbye",
+    "got", "it", "that", "helps", "helped", "appreciate", "cheers", "good", "morning",
+    "afternoon", "evening", "sounds", "sure", "yes", "no", "k", "kk"
+})
+
+# Medication and medical-advice questions must fall back regardless of products.
+# Phrases that are just as common in product questions (e.g. a product's side
+# effects) don't belong here; those are left to the model
+MEDICAL_TERMS = frozenset({
+    "medication", "medications", "meds", "med", "prescription", "prescribed", "drug", "drugs",
+    "pharmacist", "doctor", "physician", "dosage", "overdose", "pregnant", "pregnancy",
+    "breastfeeding", "nursing", "warfarin", "metformin", "lisinopril", "insulin", "statin",
+    "statins", "antidepressant", "antidepressants", "ssri", "ssris", "chemotherapy",
+    "diagnosis", "diagnosed", "surgery", "contraindication", "contraindications"
+})
+MEDICAL_PHRASES = (
+    ("blood", "thinner"), ("blood", "thinners"), ("blood", "pressure", "pills"),
+    ("birth", "control")
+)
+
+# Words that signal the answer needs more products than the ones named
+BROADENING_WORDS = frozenset({
+    "compare", "comparison", "difference", "differences", "vs", "versus", "other", "others",
+    "similar", "alternative", "alternatives", "better", "best", "instead", "which"
+})
+
+STOP_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "be", "do", "does", "did", "can", "could", "would",
+    "should", "will", "i", "me", "my", "you", "your", "we", "our", "it", "its", "this", "that",
+    "these", "those", "what", "how", "why", "when", "where", "who", "of", "for", "to", "in",
+    "on", "with", "and", "or", "if", "any", "anything", "have", "has", "there", "about", "from",
+    "take", "help", "helps", "good", "product", "products", "supplement", "supplements"
+})
+
+class LocalVerdict(NamedTuple):
+    status: str
+    required_context: List[str]
+    confidence: float
+    rule: str
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def _contains_sequence(tokens: Sequence[str], sequence: Sequence[str]) -> bool:
+    n = len(sequence)
+    return n > 0 and any(tuple(tokens[i:i + n]) == tuple(sequence) for i in range(len(tokens) - n + 1))
+
+class ProductIndex:
+    """
+    BM25 index over the titles and descriptions of one product set.
+    Titles are repeated so title terms weigh more than description terms.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    TITLE_WEIGHT = 3
+
+    def __init__(self, products: Tuple[Tuple[str, str], ...]):
+        self.titles = [title for title, _ in products]
+        self.title_tokens = [tokenize(title) for title in self.titles]
+        self.documents: List[Counter] = []
+        for title_tokens, (_, description) in zip(self.title_tokens, products):
+            self.documents.append(Counter(title_tokens * self.TITLE_WEIGHT + tokenize(description)))
+
+        lengths = [sum(doc.values()) for doc in self.documents]
+        self.lengths = lengths
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        document_frequency: Counter = Counter()
+        for doc in self.documents:
+            document_frequency.update(doc.keys())
+        n = len(self.documents)
+        self.idf: Dict[str, float] = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()
+        }
+
+    def score(self, terms: Sequence[str]) -> List[float]:
+        scores = []
+        for doc, length in zip(self.documents, self.lengths):
+            score = 0.0
+            norm = self.K1 * (1 - self.B + self.B * length / self.average_length) if self.average_length else self.K1
+            for term in terms:
+                tf = doc.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def matches_other(self, terms: Sequence[str], titles: Sequence[str]) -> bool:
+        """Whether any of `terms` matches a product other than `titles`."""
+        return any(score > 0 for title, score in zip(self.titles, self.score(terms)) if title not in titles)
+
+    def mentioned_titles(self, tokens: Sequence[str]) -> List[str]:
+        return [
+            title for title, title_tokens in zip(self.titles, self.title_tokens)
+            if _contains_sequence(tokens, title_tokens)
+        ]
+
+@lru_cache(maxsize=256)
+def _product_index(products: Tuple[Tuple[str, str], ...]) -> ProductIndex:
+    return ProductIndex(products)
+
+class LocalClassifier:
+    """
+    Lexical pre-classifier for /classify.
+
+    Rule sets catch small talk and medication questions, exact title
+    mentions select the named products, and BM25 over titles/descriptions
+    scores everything else. Each verdict carries a confidence so callers
+    only skip the model when the local answer is very likely to agree.
+    """
+
+    def classify(self, message: str, products: List[ClassifyProduct]) -> Optional[LocalVerdict]:
+        tokens = tokenize(message)
+        if not tokens:
+            # Nothing we can read (emoji, punctuation); let the model decide
+            return None
+
+        if all(token in SMALL_TALK_WORDS for token in tokens):
+            return LocalVerdict("fallback", [], 0.95, "small_talk")
+
+        if any(token in MEDICAL_TERMS for token in tokens) or any(
+            _contains_sequence(tokens, phrase) for phrase in MEDICAL_PHRASES
+        ):
+            return LocalVerdict("fallback", [], 0.92, "medical")
+
+        if not products:
+            return None
+
+        index = _product_index(tuple((p.title, p.description) for p in products))
+        broadening = any(token in BROADENING_WORDS for token in tokens)
+
+        mentioned = index.mentioned_titles(tokens)
+        if mentioned:
+            # Only confident when the rest of the question is about the named
+            # products, i.e. none of its other terms point at another product
+            named = {token for title in mentioned for token in tokenize(title)}
+            rest = [token for token in tokens if token not in STOP_WORDS and token not in named]
+            mixed = bool(rest) and index.matches_other(rest, mentioned)
+            return LocalVerdict("ok", mentioned, 0.6 if broadening or mixed else 0.92, "title_mention")
+
+        terms = [token for token in tokens if token not in STOP_WORDS]
+        if not terms:
+            return None
+        scores = index.score(terms)
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        top = scores[ranked[0]]
+        if top <= 0:
+            return None
+
+        # Confidence grows with the margin over the runner-up and with how
+        # many of the query terms the best product actually covers. Lexical
+        # matches can't tell product questions from general ones, so this
+        # stays below the default threshold until shadow data says otherwise.
+        second = scores[ranked[1]] if len(ranked) > 1 else 0.0
+        margin = (top - second) / top
+        best_doc = index.documents[ranked[0]]
+        coverage = sum(1 for term in terms if term in best_doc) / len(terms)
+        confidence = 0.5 + 0.38 * margin * coverage
+        selected = [index.titles[i] for i in ranked if scores[i] >= 0.5 * top]
+        return LocalVerdict("ok", selected, 0.5 if broadening else confidence, "bm25")
@@ -1,127 +1,446 @@
-from typing import Dict, List, Optional
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 import logging
 from fastapi import HTTPException
 
 from ..config import get_settings
 from ..models.schemas import Product
-from ..models.product_model import normalize_product
+from ..utils.metrics import UPSTREAM_HEDGES, track_upstream
+from ..utils.pagination import decode_cursor, encode_cursor
+from ..utils.profiling import phase
+from ..utils.request_log import log_fields
+from ..utils.singleflight import SingleFlight, flight_key
+from .catalog_service import CatalogService, EncodedProductCache, PositionView
+from .upstream import CLOSED, Overloaded, create_circuit_breaker
 
 logger = logging.getLogger(__name__)
 
+class ProductPage(NamedTuple):
+    products: Sequence[Product]
+    next_cursor: Optional[str] = None
+    # Pre-encoded JSON for each product, in the same order
+    encoded: Optional[List[bytes]] = None
+    # Version of the catalog snapshot the page was served from, if any
+    catalog_version: Optional[str] = None
+
 class QdrantService:
     def __init__(self):
+        # Construction is cheap and never touches the network; connectivity is
+        # verified by `warmup()` during application startup.
+        import httpx
+        from qdrant_client import QdrantClient
+
         settings = get_settings()
-        try:
-            print("Initializing Qdrant client")
-            self.client = QdrantClient(
-                url=settings.qdrant_url,
-                api_key=settings.qdrant_api_key
+        self.collection_name = settings.qdrant_collection
+        self.search_mode = settings.search_mode
+        self.indexed_fields = settings.qdrant_indexed_fields
+        self.vector_name = settings.qdrant_vector_name
+        self._verified = False
+        self._flights = SingleFlight()
+        self._encoded_products = EncodedProductCache()
+        # Request-path reads fail fast while Qdrant is unhealthy, and slow
+        # ones are hedged with a second attempt
+        self.breaker = create_circuit_breaker("qdrant", settings.qdrant_slow_call_seconds)
+        self.hedge_reads = settings.qdrant_hedge_reads
+        self.hedge_min_delay = settings.qdrant_hedge_min_delay_ms / 1000.0
+        self._max_hedges = max(1, settings.qdrant_max_workers // 4)
+        self._hedges = 0
+
+        # Blocking client calls run on a dedicated, bounded executor whose
+        # size matches the client's connection pool
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.qdrant_max_workers,
+            thread_name_prefix="qdrant"
+        )
+        self.client = QdrantClient(
+            url=settings.qdrant_url,
+            api_key=settings.qdrant_api_key,
+            timeout=settings.qdrant_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.qdrant_max_workers,
+                max_keepalive_connections=settings.qdrant_max_workers
             )
-            self.collection_name = settings.qdrant_collection
-            
-            # Verify collection exists
+        )
+        self.catalog = CatalogService(
+            self.client,
+            self.collection_name,
+            refresh_interval=settings.catalog_refresh_interval,
+            check_interval=settings.catalog_check_interval,
+            snapshot_path=settings.catalog_snapshot_path,
+            source=settings.catalog_source,
+            watch_interval=settings.catalog_watch_interval
+        )
+
+    @property
+    def ready(self) -> bool:
+        """Whether the service can answer searches without a cold Qdrant round-trip."""
+        if self.search_mode == "snapshot":
+            return self.catalog.loaded
+        return self._verified
+
+    @property
+    def catalog_version(self) -> Optional[str]:
+        """Version of the loaded catalog snapshot, or None when searches go to Qdrant."""
+        if self.search_mode == "snapshot" and self.catalog.loaded:
+            return self.catalog.snapshot.version
+        return None
+
+    def warmup(self) -> None:
+        """
+        Verify the collection, prepare payload indexes and, in snapshot mode,
+        load the catalog and start its background refresh.
+
+        In snapshot mode a catalog persisted on disk is served first, so the
+        service is ready even if Qdrant is slow or unreachable; the refresh
+        thread reconciles it with Qdrant once it answers.
+
+        With a shared catalog only the published snapshot is needed: the
+        catalog loader checks the collection, so Qdrant being down doesn't
+        keep workers from becoming ready.
+
+        Blocking; run it on the service executor.
+        """
+        if self.search_mode == "snapshot" and self.catalog.source == "shared":
+            if not self.catalog.loaded:
+                self.catalog.refresh()
+            self.catalog.start()
+            self._verified = True
+            return
+
+        if self.search_mode == "snapshot" and not self.catalog.loaded and self.catalog.restore():
+            self.catalog.start()
+
+        collection_names = [collection.name for collection in self.client.get_collections().collections]
+        if self.collection_name not in collection_names:
+            raise RuntimeError(f"Collection {self.collection_name} not found in Qdrant")
+        logger.info(f"Using Qdrant collection {self.collection_name} ({len(collection_names)} available)")
+
+        if self.search_mode == "qdrant":
+            self.ensure_payload_indexes(self.indexed_fields)
+        else:
+            if not self.catalog.loaded:
+                self.catalog.refresh()
+            self.catalog.start()
+        self._verified = True
+
+    def ensure_payload_indexes(self, fields: List[str]) -> None:
+        """
+        Create keyword payload indexes for the filterable fields so Qdrant
+        can answer filtered scrolls without a full scan.
+        """
+        from qdrant_client.http import models
+
+        try:
+            existing = set(self.client.get_collection(self.collection_name).payload_schema or {})
+        except Exception as e:
+            logger.warning(f"Could not read payload schema: {str(e)}")
+            existing = set()
+
+        for field in fields:
+            if field in existing:
+                continue
             try:
-                collections = self.client.get_collections().collections
-                collection_names = [collection.name for collection in collections]
-                print("="*50)
-                print("📚 Available Collections")
-                print(f"Found {len(collection_names)} collections:")
-                for name in collection_names:
-                    print(f"  - {name}")
-                print(f"Using collection: {self.collection_name}")
-                
-                if self.collection_name not in collection_names:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Collection {self.collection_name} not found in Qdrant"
-                    )
-                    
-                # Try to get a sample point to verify collection is accessible
-                try:
-                    points, _ = self.client.scroll(
-                        collection_name=self.collection_name,
-                        limit=1,
-                        with_payload=True
-                    )
-                    if points and len(points) > 0:
-                        print("\n✅ Successfully connected to collection")
-                        print(f"Sample point ID: {points[0].id}")
-                    else:
-                        print("\n⚠️ Collection is empty")
-                except Exception as e:
-                    logger.warning(f"Could not fetch sample point: {str(e)}")
-                    print("\n⚠️ Could not fetch sample point, but collection exists")
-                
-                print("="*50)
-                
-            except Exception as e:
-                logger.error(f"Failed to verify collection: {str(e)}", exc_info=True)
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to connect to search service"
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=models.PayloadSchemaType.KEYWORD
                 )
-                
+                logger.info(f"Created payload index on '{field}'")
+            except Exception as e:
+                logger.warning(f"Could not create payload index on '{field}': {str(e)}")
+
+    def query_products_page(
+        self,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> ProductPage:
+        """
+        Query one page of products matching the metadata filters.
+
+        In "snapshot" mode the page is served from the in-memory catalog; in
+        "qdrant" mode the filters are pushed down to Qdrant and only the
+        requested page is fetched. Either way, `next_cursor` continues the
+        same query.
+        """
+        try:
+            offset = decode_cursor(cursor, self.search_mode, filters) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+
+        catalog_version = None
+        try:
+            if self.search_mode == "qdrant":
+                products, encoded, next_offset = self._guarded(self._scroll_filtered, filters, limit, offset)
+            else:
+                # Match against the in-memory catalog snapshot
+                snapshot = self.catalog.snapshot
+                positions, next_offset = snapshot.page(filters, limit, offset or 0)
+                # Products are only parsed if a caller reads them; responses use the encoded JSON
+                products = PositionView(snapshot.products, positions)
+                encoded = [snapshot.encoded[position] for position in positions]
+                catalog_version = snapshot.version
+        except Overloaded:
+            raise
         except Exception as e:
-            logger.error(f"Failed to initialize Qdrant client: {str(e)}", exc_info=True)
+            logger.error(f"Error querying Qdrant: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=500,
-                detail="Failed to initialize search service"
+                detail="Error querying product database"
             )
 
-    def query_products_with_filters(
+        next_cursor = None
+        if next_offset is not None:
+            next_cursor = encode_cursor(self.search_mode, next_offset, filters)
+        return ProductPage(
+            products=products,
+            next_cursor=next_cursor,
+            encoded=encoded,
+            catalog_version=catalog_version
+        )
+
+    async def query_products_page_async(
         self,
         filters: Optional[Dict[str, str]] = None,
-        limit: int = 10
-    ) -> List[Product]:
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> ProductPage:
         """
-        Query products from Qdrant using metadata filters.
-        Returns normalized Product objects.
+        Non-blocking variant of `query_products_page` for async routes.
+
+        Pages served from an already loaded snapshot are answered inline;
+        anything that needs a Qdrant round-trip runs on the service executor.
         """
-        print("="*50)
-        print("Querying products with filters")
-        print(f"Filters: {filters}")
-        print(f"Limit: {limit}")
-        print("="*50)
+        log_fields(search_mode=self.search_mode)
+        if self.search_mode == "snapshot" and self.catalog.loaded:
+            with phase("catalog"):
+                return self.query_products_page(filters, limit, cursor)
+
+        # Identical concurrent queries share one Qdrant round-trip
+        key = flight_key(self.search_mode, filters, limit, cursor)
+        # A cold snapshot load is never hedged; it reads the whole collection
+        run = self.run_hedged if self.search_mode == "qdrant" else self.run_blocking
+        return await self._flights.do(
+            key,
+            lambda: run(self.query_products_page, filters, limit, cursor)
+        )
 
-        if not filters:
-            print("No filters provided")
-            filters = {}
+    def semantic_page(
+        self,
+        query: str,
+        vector: List[float],
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> ProductPage:
+        """
+        Vector search for the products nearest to an embedded query, with the
+        metadata filters applied inside Qdrant. Results are ranked by score.
+        """
+        try:
+            offset = decode_cursor(cursor, "semantic", filters, query) if cursor else 0
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
 
         try:
-            # Get all points and filter in memory
-            points, _ = self.client.scroll(
+            points = self._guarded(
+                self.client.search,
                 collection_name=self.collection_name,
-                limit=1000,  # Get a reasonable number of points
-                with_payload=True
+                query_vector=(self.vector_name, vector) if self.vector_name else vector,
+                query_filter=build_filter(filters),
+                limit=limit,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
             )
-            
-            # Filter points based on criteria
-            filtered_points = []
-            for point in points:
-                matches = True
-                for key, value in filters.items():
-                    if key not in point.payload or point.payload[key] != value:
-                        matches = False
-                        break
-                if matches:
-                    filtered_points.append(point)
-                    
-            # Take only the requested number of points
-            results = filtered_points[:limit]
-
-            # Normalize and return products
-            return [
-                normalize_product(point.payload)
-                for point in results
-            ]
+        except Overloaded:
+            raise
         except Exception as e:
-            logger.error(f"Error querying Qdrant: {str(e)}", exc_info=True)
+            logger.error(f"Error searching Qdrant: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=500,
                 detail="Error querying product database"
             )
 
-# Create a singleton instance
-qdrant_service = QdrantService()
+        products: List[Product] = []
+        encoded: List[bytes] = []
+        for point in points:
+            try:
+                product, product_json = self._encoded_products.get(point.id, point.payload or {})
+            except ValueError as e:
+                logger.warning(f"Skipping point {point.id}: {str(e)}")
+                continue
+            products.append(product)
+            encoded.append(product_json)
+
+        next_cursor = None
+        if len(points) == limit:
+            next_cursor = encode_cursor("semantic", offset + limit, filters, query)
+        return ProductPage(products=products, next_cursor=next_cursor, encoded=encoded)
+
+    async def semantic_page_async(
+        self,
+        query: str,
+        vector: List[float],
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> ProductPage:
+        """Non-blocking variant of `semantic_page` for async routes."""
+        log_fields(search_mode="semantic")
+        key = flight_key("semantic", query, filters, limit, cursor)
+        return await self._flights.do(
+            key,
+            lambda: self.run_hedged(self.semantic_page, query, vector, filters, limit, cursor)
+        )
+
+    async def run_blocking(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking call on the Qdrant executor without stalling the event loop."""
+        def timed() -> Any:
+            with track_upstream("qdrant", fn.__name__), phase("qdrant", fn.__name__):
+                return fn(*args, **kwargs)
+
+        # Carry the request context over so records logged on the executor keep their request ID
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, context.run, timed)
+
+    async def run_hedged(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Run an idempotent blocking read, starting an identical second attempt
+        if the first hasn't finished after the recent p95 read latency. The
+        first attempt to succeed wins; the other's result is discarded.
+
+        Hedges are skipped until there is enough latency history, while the
+        circuit is not closed, and beyond a small number in flight, so they
+        can't double the load on a struggling Qdrant.
+        """
+        primary = asyncio.ensure_future(self.run_blocking(fn, *args))
+        delay = self._hedge_delay()
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or self._hedges >= self._max_hedges or self.breaker.state != CLOSED:
+            return await primary
+
+        self._hedges += 1
+        hedge = asyncio.ensure_future(self.run_blocking(fn, *args))
+        hedge.add_done_callback(self._hedge_done)
+        log_fields(hedged=True)
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        UPSTREAM_HEDGES.inc(("qdrant", "primary" if attempt is primary else "hedge"))
+                        return attempt.result()
+            # Both attempts failed; report the primary's error
+            return primary.result()
+        finally:
+            # A losing attempt's thread can't be interrupted; let it finish unobserved
+            for attempt in pending:
+                attempt.add_done_callback(_discard_result)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge_reads:
+            return None
+        p95 = self.breaker.latency_quantile(0.95)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def _hedge_done(self, hedge: "asyncio.Future[Any]") -> None:
+        self._hedges -= 1
+        _discard_result(hedge)
+
+    def _guarded(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Make a blocking Qdrant read through the circuit breaker."""
+        self.breaker.allow()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.breaker.record(True, time.monotonic() - started)
+            raise
+        self.breaker.record(False, time.monotonic() - started)
+        return result
+
+    def close(self) -> None:
+        """Stop background refreshes and release the executor."""
+        self.catalog.stop()
+        self._executor.shutdown(wait=False)
+
+    def query_products_with_filters(
+        self,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 10
+    ) -> List[Product]:
+        """
+        Query products using metadata filters.
+        Returns normalized Product objects.
+        """
+        return list(self.query_products_page(filters, limit).products)
+
+    def _scroll_filtered(
+        self,
+        filters: Optional[Dict[str, str]],
+        limit: int,
+        offset=None
+    ) -> Tuple[List[Product], List[bytes], Optional[Union[int, str]]]:
+        """
+        Scroll only the points matching the filters, following `next_page_offset`
+        until `limit` valid products are collected or the collection is exhausted.
+        Returns the products, their pre-encoded JSON and the next offset.
+        """
+        scroll_filter = build_filter(filters)
+        products: List[Product] = []
+        encoded: List[bytes] = []
+        while len(products) < limit:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=limit - len(products),
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            for point in points:
+                try:
+                    product, product_json = self._encoded_products.get(point.id, point.payload or {})
+                except ValueError as e:
+                    logger.warning(f"Skipping point {point.id}: {str(e)}")
+                    continue
+                products.append(product)
+                encoded.append(product_json)
+            if offset is None:
+                break
+        return products, encoded, offset
+
+def _discard_result(attempt: "asyncio.Future[Any]") -> None:
+    # Mark an unobserved attempt's error as retrieved
+    if not attempt.cancelled():
+        attempt.exception()
+
+def build_filter(filters: Optional[Dict[str, str]]):
+    """
+    Translate SearchRequest filters into a Qdrant filter of exact-match clauses.
+    """
+    from qdrant_client.http import models
+
+    if not filters:
+        return None
+    return models.Filter(
+        must=[
+            models.FieldCondition(key=key, match=models.MatchValue(value=value))
+            for key, value in filters.items()
+        ]
+    )
+
+@lru_cache()
+def get_qdrant_service() -> QdrantService:
+    """Return the process-wide QdrantService, creating it on first use."""
+    return QdrantService()
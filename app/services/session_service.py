@@ -0,0 +1,148 @@
+import logging
+import secrets
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from ..config import get_settings
+from ..models.schemas import ChatMessage, ChatRequest, ContextDelta, Product, QuizAnswer
+from ..utils.cache import ResultCache, create_cache_backend
+from ..utils.context_formatter import MAX_HISTORY_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# Longest excerpt of one message kept in the compacted conversation summary
+SUMMARY_LINE_CHARS = 200
+
+class ChatSession(BaseModel):
+    id: str
+    products: List[Product] = []
+    answers: List[QuizAnswer] = []
+    summary: str = ""
+    history: List[ChatMessage] = []
+    conversation_summary: str = ""
+
+    def apply(self, delta: ContextDelta) -> None:
+        if delta.products is not None:
+            self.products = delta.products
+        if delta.answers is not None:
+            self.answers = delta.answers
+        if delta.summary is not None:
+            self.summary = delta.summary
+
+    def context(self) -> Dict:
+        """The session as a chat context for the prompt builder."""
+        return {
+            "products": self.products,
+            "answers": self.answers,
+            "summary": self.summary,
+            "chatMessages": self.history,
+            "conversationSummary": self.conversation_summary
+        }
+
+def compact_history(summary: str, messages: List[ChatMessage], max_chars: int) -> str:
+    """
+    Fold messages that fell out of the recent window into the rolling
+    summary, one short line each. The oldest lines go first once the
+    summary exceeds `max_chars`.
+    """
+    lines = summary.splitlines() if summary else []
+    for message in messages:
+        content = " ".join(message.content.split())
+        if len(content) > SUMMARY_LINE_CHARS:
+            content = content[:SUMMARY_LINE_CHARS].rstrip() + "…"
+        lines.append(f"{message.role}: {content}")
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+class SessionService:
+    """
+    Server-side chat sessions, so clients send only the new message and
+    context deltas instead of the whole conversation on every turn.
+
+    Sessions live in a result cache backend (an LRU in memory, or Redis)
+    with a sliding TTL. The most recent messages are kept verbatim and
+    older ones are compacted into a bounded rolling summary.
+    """
+
+    def __init__(self, cache: ResultCache, summary_chars: int = 1200, max_history: int = MAX_HISTORY_MESSAGES):
+        self.cache = cache
+        self.summary_chars = summary_chars
+        self.max_history = max_history
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache.enabled
+
+    async def resolve(self, chat_request: ChatRequest) -> Tuple[Optional[ChatSession], Dict]:
+        """
+        Return the session for a chat request (if any) and the context to answer it with.
+
+        Raises:
+            HTTPException: 404 if the session is unknown or expired, so the
+                client can start a new one from its full context.
+        """
+        if chat_request.session_id:
+            session = await self.get(chat_request.session_id)
+            if session is None:
+                raise HTTPException(status_code=404, detail="Unknown or expired session")
+            if chat_request.context_delta is not None:
+                session.apply(chat_request.context_delta)
+            return session, session.context()
+
+        if not chat_request.start_session or not self.enabled:
+            return None, chat_request.context
+
+        session = self.create(chat_request.context)
+        return session, session.context()
+
+    def create(self, context: Dict) -> ChatSession:
+        session = ChatSession(
+            id=secrets.token_urlsafe(16),
+            products=context.get("products") or [],
+            answers=context.get("answers") or [],
+            summary=context.get("summary") or ""
+        )
+        messages = [
+            ChatMessage.parse_obj(message) if isinstance(message, dict) else message
+            for message in context.get("chatMessages") or []
+        ]
+        self._append(session, messages)
+        return session
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        raw = await self.cache.get(session_id)
+        return ChatSession.parse_obj(raw) if raw is not None else None
+
+    async def record_turn(self, session: ChatSession, message: str, reply: str) -> None:
+        """Append a completed exchange and store the session, renewing its TTL."""
+        self._append(session, [
+            ChatMessage(role="user", content=message),
+            ChatMessage(role="assistant", content=reply)
+        ])
+        await self.cache.set(session.id, session.dict())
+
+    def _append(self, session: ChatSession, messages: List[ChatMessage]) -> None:
+        history = session.history + messages
+        overflow = len(history) - self.max_history
+        if overflow > 0:
+            session.conversation_summary = compact_history(
+                session.conversation_summary, history[:overflow], self.summary_chars
+            )
+            history = history[overflow:]
+        session.history = history
+
+@lru_cache()
+def get_session_service() -> SessionService:
+    """Return the process-wide SessionService, creating it on first use."""
+    settings = get_settings()
+    backend = create_cache_backend(
+        settings.session_backend,
+        max_entries=settings.session_max_entries,
+        redis_url=settings.redis_url
+    )
+    cache = ResultCache(backend, ttl=settings.session_ttl, namespace="session")
+    return SessionService(cache, summary_chars=settings.session_summary_chars)
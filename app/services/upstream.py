@@ -0,0 +1,448 @@
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from ..config import get_settings
+from ..utils.metrics import REGISTRY, CallbackGauge, track_upstream
+
+logger = logging.getLogger(__name__)
+
+_SCHEDULERS: List["UpstreamScheduler"] = []
+_BREAKERS: List["CircuitBreaker"] = []
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+T = TypeVar("T")
+
+class Overloaded(Exception):
+    """Raised when a call is shed because it can't start in time to meet its deadline."""
+
+    def __init__(self, upstream: str, retry_after: float = 1.0, reason: str = "overloaded, request shed"):
+        super().__init__(f"{upstream} is {reason}")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class CircuitOpen(Overloaded):
+    """Raised without calling the upstream while its circuit breaker is open."""
+
+    def __init__(self, upstream: str, retry_after: float = 1.0):
+        super().__init__(upstream, retry_after, reason="unavailable, circuit open")
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+def is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) == 429
+
+def is_retryable(error: Exception) -> bool:
+    """429s, 5xx responses, timeouts and connection errors are worth another attempt."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in (
+        "APITimeoutError", "APIConnectionError"
+    )
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Errors that say the upstream is unhealthy, as opposed to a bad request or rate limiting."""
+    return is_retryable(error) and not is_rate_limited(error)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (or OpenAI's retry-after-ms) from an API error's response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+class CircuitBreaker:
+    """
+    Fails calls to an unhealthy upstream fast instead of letting every
+    request wait it out.
+
+    Outcomes over the last `window` seconds are tracked. Once at least
+    `min_calls` have been seen and the share of failures reaches
+    `failure_rate`, or the share of calls slower than `slow_call_seconds`
+    reaches `slow_call_rate`, the circuit opens and calls are rejected with
+    `CircuitOpen` for `open_seconds`. It then goes half-open and lets up to
+    `half_open_calls` probes through: it closes once they all succeed and
+    opens again on the first failure.
+
+    Thread-safe, so blocking clients running on executors can share it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 30.0,
+        min_calls: int = 20,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 15.0,
+        half_open_calls: int = 3
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self.rejected = 0
+        # (time, failed, slow) per call in the window, with running totals
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        # Latencies of recent successful calls, for hedging delays
+        self._latencies: Deque[float] = deque(maxlen=256)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        _BREAKERS.append(self)
+
+    def allow(self) -> None:
+        """
+        Admit one call, or raise CircuitOpen. Every admitted call must be
+        followed by `record` (or `cancel` if it never reached the upstream).
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, retry_after=max(1.0, remaining))
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name)
+                self._probes += 1
+
+    def cancel(self) -> None:
+        """Give back an admission whose call was never made, or was cancelled midway."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def record(self, failed: bool, latency: Optional[float] = None) -> None:
+        """
+        Feed an admitted call's outcome into the breaker. A latency of None
+        (e.g. for streams, whose duration depends on their length) is never
+        judged slow.
+        """
+        now = time.monotonic()
+        slow = latency is not None and latency > self.slow_call_seconds
+        with self._lock:
+            if not failed and latency is not None:
+                self._latencies.append(latency)
+
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._open(now, "probe call failed" if failed else "probe call was slow")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._transition(CLOSED)
+                        logger.info(f"{self.name} circuit closed")
+                return
+            if self.state == OPEN:
+                return
+
+            self._outcomes.append((now, failed, slow))
+            self._failures += failed
+            self._slow += slow
+            cutoff = now - self.window
+            while self._outcomes and self._outcomes[0][0] < cutoff:
+                _, old_failed, old_slow = self._outcomes.popleft()
+                self._failures -= old_failed
+                self._slow -= old_slow
+
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            if self._failures / calls >= self.failure_rate:
+                self._open(now, f"{self._failures} of {calls} calls failed")
+            elif self._slow / calls >= self.slow_call_rate:
+                self._open(now, f"{self._slow} of {calls} calls took over {self.slow_call_seconds:g}s")
+
+    def latency_quantile(self, quantile: float) -> Optional[float]:
+        """Latency quantile of recent successful calls, or None until there are enough of them."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < 20:
+            return None
+        return latencies[min(len(latencies) - 1, math.ceil(quantile * len(latencies)) - 1)]
+
+    def _open(self, now: float, reason: str) -> None:
+        self._transition(OPEN)
+        self._opened_at = now
+        logger.warning(f"{self.name} circuit opened for {self.open_seconds:g}s: {reason}")
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        self._outcomes.clear()
+        self._failures = self._slow = 0
+        self._probes = self._probe_successes = 0
+
+def create_circuit_breaker(name: str, slow_call_seconds: float) -> CircuitBreaker:
+    """Build a circuit breaker for one upstream from the shared circuit settings."""
+    settings = get_settings()
+    return CircuitBreaker(
+        name,
+        window=settings.circuit_window,
+        min_calls=settings.circuit_min_calls,
+        failure_rate=settings.circuit_failure_rate,
+        slow_call_seconds=slow_call_seconds,
+        slow_call_rate=settings.circuit_slow_call_rate,
+        open_seconds=settings.circuit_open_seconds,
+        half_open_calls=settings.circuit_half_open_calls
+    )
+
+class UpstreamScheduler:
+    """
+    Admission control for one upstream API.
+
+    Concurrency is bounded by an AIMD limit: it grows by roughly one slot per
+    window of successful, timely calls and halves on 429s or slow calls.
+    Callers over the limit wait in a FIFO queue; a caller whose deadline can't
+    be met given the queue ahead of it is shed immediately with `Overloaded`
+    rather than left to time out. `call` adds jittered retries that honor
+    Retry-After. With a circuit breaker, calls fail fast with `CircuitOpen`
+    while the upstream is unhealthy.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        slow_call_seconds: float = 20.0,
+        max_retries: int = 3,
+        base_backoff: float = 0.5,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.slow_call_seconds = slow_call_seconds
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.breaker = breaker
+
+        self.in_flight = 0
+        self.shed = 0
+        self.latency_ewma = 1.0
+        self._waiters: Deque[Tuple["asyncio.Future[None]", float]] = deque()
+        self._last_decrease = 0.0
+        _SCHEDULERS.append(self)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, deadline: float) -> None:
+        """Wait for a concurrency slot, or raise Overloaded if it can't arrive before `deadline`."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        # Expected wait: the queue ahead of us drains `limit` calls per average latency
+        now = time.monotonic()
+        expected_start = now + (len(self._waiters) + 1) * self.latency_ewma / max(self.limit, 1.0)
+        if expected_start + self.latency_ewma > deadline:
+            self._shed()
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, deadline)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=max(0.0, deadline - now))
+        except asyncio.TimeoutError:
+            self._abandon(entry)
+            self._shed()
+        except asyncio.CancelledError:
+            self._abandon(entry)
+            raise
+
+    def release(self, latency: float, rate_limited: bool = False, failed: bool = False) -> None:
+        """Return a slot and feed the call's outcome into the limit."""
+        self.in_flight -= 1
+        now = time.monotonic()
+        if not failed:
+            self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+
+        congested = rate_limited or latency > self.slow_call_seconds
+        if congested:
+            # Halve at most once per average latency so one burst of 429s doesn't collapse the limit
+            if now - self._last_decrease > self.latency_ewma:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+                self._last_decrease = now
+                logger.warning(f"{self.name} congested, concurrency limit now {int(self.limit)}")
+        elif not failed and self.in_flight + 1 >= int(self.limit):
+            # Only grow when the limit was actually the bottleneck
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, deadline: float, operation: str = "stream") -> AsyncIterator[None]:
+        """Hold a concurrency slot for the body of the block (e.g. a streaming response)."""
+        await self._admit(deadline)
+        started = time.monotonic()
+        rate_limited = failed = unhealthy = cancelled = False
+        try:
+            with track_upstream(self.name, operation):
+                yield
+        except Exception as e:
+            # Judge the API error itself when the block wrapped it
+            cause = e.__cause__ if isinstance(e.__cause__, Exception) else e
+            rate_limited, failed, unhealthy = is_rate_limited(cause), True, is_upstream_failure(cause)
+            raise
+        except BaseException:
+            # Cancelled: says nothing about the upstream's health
+            failed = cancelled = True
+            raise
+        finally:
+            self.release(time.monotonic() - started, rate_limited=rate_limited, failed=failed)
+            if self.breaker is not None:
+                if cancelled:
+                    self.breaker.cancel()
+                else:
+                    # A stream's duration depends on its length, so only errors count
+                    self.breaker.record(unhealthy)
+
+    async def call(self, fn: Callable[[float], Awaitable[T]], deadline: float, operation: str = "call") -> T:
+        """
+        Run `fn(remaining_seconds)` under admission control, retrying retryable
+        errors with full-jitter backoff (or Retry-After, when longer) while the
+        deadline allows.
+        """
+        attempt = 0
+        while True:
+            await self._admit(deadline)
+            started = time.monotonic()
+            try:
+                with track_upstream(self.name, operation):
+                    result = await fn(max(0.1, deadline - started))
+            except Exception as e:
+                latency = time.monotonic() - started
+                self.release(latency, rate_limited=is_rate_limited(e), failed=True)
+                if self.breaker is not None:
+                    self.breaker.record(is_upstream_failure(e), latency)
+                attempt += 1
+                if attempt > self.max_retries or not is_retryable(e):
+                    raise
+                backoff = random.uniform(0, self.base_backoff * 2 ** attempt)
+                delay = max(backoff, retry_after_seconds(e) or 0.0)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning(f"{self.name} call failed ({str(e)}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled, e.g. the client went away: the slot and any half-open probe must still be returned
+                self.release(time.monotonic() - started, failed=True)
+                if self.breaker is not None:
+                    self.breaker.cancel()
+                raise
+            latency = time.monotonic() - started
+            self.release(latency)
+            if self.breaker is not None:
+                self.breaker.record(False, latency)
+            return result
+
+    async def _admit(self, deadline: float) -> None:
+        """Pass the circuit breaker, then wait for a concurrency slot."""
+        if self.breaker is None:
+            await self.acquire(deadline)
+            return
+        self.breaker.allow()
+        try:
+            await self.acquire(deadline)
+        except BaseException:
+            self.breaker.cancel()
+            raise
+
+    def _shed(self) -> None:
+        self.shed += 1
+        raise Overloaded(self.name, retry_after=max(1.0, self.latency_ewma))
+
+    def _abandon(self, entry: Tuple["asyncio.Future[None]", float]) -> None:
+        waiter, _ = entry
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            # Already handed a slot; give it back
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._wake()
+
+    def _wake(self) -> None:
+        now = time.monotonic()
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter, deadline = self._waiters.popleft()
+            if waiter.done() or deadline <= now:
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+def _scheduler_gauge(attribute: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    return lambda: {(scheduler.name,): float(getattr(scheduler, attribute)) for scheduler in _SCHEDULERS}
+
+REGISTRY.register(CallbackGauge(
+    "upstream_concurrency_limit",
+    "Current adaptive concurrency limit per upstream.",
+    ("upstream",),
+    _scheduler_gauge("limit")
+))
+REGISTRY.register(CallbackGauge(
+    "upstream_queue_depth",
+    "Calls waiting for an upstream concurrency slot.",
+    ("upstream",),
+    _scheduler_gauge("queued")
+))
+REGISTRY.register(CallbackGauge(
+    "upstream_shed",
+    "Calls shed by admission control since startup.",
+    ("upstream",),
+    _scheduler_gauge("shed")
+))
+
+def _breaker_states() -> Dict[Tuple[str, ...], float]:
+    return {
+        (breaker.name, state): float(breaker.state == state)
+        for breaker in _BREAKERS
+        for state in (CLOSED, HALF_OPEN, OPEN)
+    }
+
+REGISTRY.register(CallbackGauge(
+    "upstream_circuit_state",
+    "Circuit breaker state per upstream (1 for the current state).",
+    ("upstream", "state"),
+    _breaker_states
+))
+REGISTRY.register(CallbackGauge(
+    "upstream_circuit_rejected",
+    "Calls rejected by an open circuit since startup.",
+    ("upstream",),
+    lambda: {(breaker.name,): float(breaker.rejected) for breaker in _BREAKERS}
+))
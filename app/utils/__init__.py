@@ -4,5 +4,6 @@ Utility functions for the Brightside backend.
 
 from .api_utils import validate_api_key, check_rate_limit
 from .context_formatter import format_context_to_system_prompt
+from .pagination import encode_cursor, decode_cursor
 
-__all__ = ['validate_api_key', 'check_rate_limit', 'format_context_to_system_prompt'] 
\ No newline at end of file
+__all__ = ['validate_api_key', 'check_rate_limit', 'format_context_to_system_prompt', 'encode_cursor', 'decode_cursor'] 
\ No newline at end of file
@@ -1,15 +1,56 @@
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
+import hashlib
+import hmac
+from typing import Optional
 from fastapi import HTTPException, Request
 from ..config import get_settings
+from .rate_limit import RateLimitExceeded, get_rate_limiter, retry_after_header
 
-# Simple in-memory rate limiter
-_rate_limits: Dict[str, Tuple[int, datetime]] = {}
+API_KEY_HEADER = "X-API-Key"
+
+def _matches(provided: str, key: str) -> bool:
+    return hmac.compare_digest(provided.encode("utf-8"), key.encode("utf-8"))
+
+def _client_api_key(request: Optional[Request]) -> Optional[str]:
+    """The request's API key if it is one of the configured per-client keys."""
+    provided = request.headers.get(API_KEY_HEADER) if request is not None else None
+    if not provided:
+        return None
+    return next((key for key in get_settings().client_api_keys if _matches(provided, key)), None)
 
 def validate_api_key(request: Request) -> None:
-    """Temporarily disabled API key validation for debugging CORS issues."""
-    return
+    """Reject requests without the expected (or a per-client) API key when REQUIRE_API_KEY is enabled."""
+    settings = get_settings()
+    if not settings.require_api_key:
+        return
+    provided = request.headers.get(API_KEY_HEADER, "")
+    if settings.expected_api_key and _matches(provided, settings.expected_api_key):
+        return
+    if _client_api_key(request) is None:
+        raise HTTPException(status_code=401, detail="Invalid or missing API key")
+
+def client_key(ip: str, request: Request = None) -> str:
+    """
+    Identify a client by its per-client API key, otherwise by IP. Unknown
+    keys (and the shared key) don't count, so sending a different header
+    on every request can't buy a fresh bucket.
+    """
+    api_key = _client_api_key(request)
+    if api_key is not None:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return f"ip:{ip}"
+
+async def check_rate_limit(ip: str, request: Request = None, scope: str = "gpt", cost: float = 1.0) -> None:
+    """
+    Enforce the per-client rate limit for a route scope.
 
-def check_rate_limit(ip: str, request: Request = None) -> None:
-    """Temporarily disabled rate limiting for debugging CORS issues."""
-    return 
\ No newline at end of file
+    Raises:
+        HTTPException: 429 with a Retry-After header when the client is over its limit.
+    """
+    try:
+        await get_rate_limiter().check(scope, client_key(ip, request), cost)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded, please try again later",
+            headers=retry_after_header(e.retry_after)
+        )
@@ -0,0 +1,47 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, TypeVar, Union
+
+from fastapi import HTTPException
+
+from ..services.upstream import Overloaded
+from .singleflight import flight_key
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+async def run_batch(
+    items: Sequence[T],
+    fn: Callable[[T], Awaitable[R]],
+    key: Callable[[T], Any]
+) -> List[Union[R, Exception]]:
+    """
+    Run `fn` concurrently over the distinct items (by `key`) and return one
+    outcome per input item, in order: its result, or the exception it raised.
+    """
+    keys = [flight_key(key(item)) for item in items]
+    unique: Dict[str, T] = {}
+    for item_key, item in zip(keys, items):
+        unique.setdefault(item_key, item)
+
+    outcomes = await asyncio.gather(*(fn(item) for item in unique.values()), return_exceptions=True)
+    for outcome in outcomes:
+        # Cancellation and other BaseExceptions are not per-item errors
+        if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+            raise outcome
+    by_key = dict(zip(unique, outcomes))
+    return [by_key[item_key] for item_key in keys]
+
+def batch_error(error: Exception) -> Dict[str, Any]:
+    """The per-item error a batch response reports in place of a failed item's result."""
+    if isinstance(error, HTTPException):
+        return {"status_code": error.status_code, "detail": str(error.detail)}
+    if isinstance(error, Overloaded):
+        return {"status_code": 503, "detail": str(error)}
+    logger.error(f"Batch item failed: {type(error).__name__}: {str(error)}", exc_info=error)
+    return {"status_code": 500, "detail": f"Error processing request: {str(error)}"}
+
+def distinct_count(items: Sequence[Any], key: Callable[[Any], Any]) -> int:
+    return len({flight_key(key(item)) for item in items})
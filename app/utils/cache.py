@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """
+    Minimal async key/value interface for result caches. Values are strings
+    so any backend can store them.
+    """
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        raise NotImplementedError
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    Process-local LRU cache with per-entry expiry. Memory is bounded by
+    `max_entries`; the least recently used entry is evicted first.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared cache backed by Redis, so replicas reuse each other's results.
+    Requires the optional `redis` package (>= 4.2).
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The redis cache backend requires the 'redis' package")
+        self._client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._client.set(key, value, px=int(ttl * 1000))
+
+def create_cache_backend(kind: str, max_entries: int = 2048, redis_url: Optional[str] = None) -> Optional[CacheBackend]:
+    """
+    Build a cache backend from settings: "memory" (default), "redis", or "none" to disable caching.
+    """
+    kind = (kind or "memory").lower()
+    if kind == "none":
+        return None
+    if kind == "redis":
+        if not redis_url:
+            raise RuntimeError("REDIS_URL must be set for the redis cache backend")
+        return RedisCacheBackend(redis_url)
+    return InMemoryCacheBackend(max_entries)
+
+class ResultCache:
+    """
+    JSON result cache with hit/miss accounting on top of a CacheBackend.
+
+    Backend failures are logged and treated as misses so a cache outage
+    never fails the request it was meant to speed up.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: float, namespace: str):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        # Writes started by `set_later` and not finished yet, by key
+        self._pending: Dict[str, "asyncio.Future[None]"] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get(self, key: str) -> Optional[Any]:
+        if self.backend is None:
+            return None
+        try:
+            raw = await self.backend.get(f"{self.namespace}:{key}")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache read failed for {self.namespace}: {str(e)}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            CACHE_LOOKUPS.inc((self.namespace, "miss"))
+            return None
+        self.hits += 1
+        CACHE_LOOKUPS.inc((self.namespace, "hit"))
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any) -> None:
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(f"{self.namespace}:{key}", json.dumps(value), self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache write failed for {self.namespace}: {str(e)}")
+
+    def set_later(self, key: str, value: Any) -> None:
+        """
+        Write in the background, for writes the response shouldn't wait on
+        (e.g. with a network backend). A write for a key that is still
+        pending is dropped rather than queued behind it.
+        """
+        if self.backend is None or key in self._pending:
+            return
+        task = asyncio.ensure_future(self.set(key, value))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
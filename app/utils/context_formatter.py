@@ -1,39 +1,7 @@
-from typing import List, Dict
-from ..models.schemas import Product, QuizAnswer, ChatMessage
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
-def format_context_to_system_prompt(context: Dict) -> str:
-    """
-    Formats the context information into a comprehensive system prompt for GPT.
-    
-    Args:
-        context: Dictionary containing products, answers, summary, and chat messages
-        
-    Returns:
-        str: Formatted system prompt
-    """
-    products = context.get("products", [])
-    answers = context.get("answers", [])
-    summary = context.get("summary", "")
-    chat_messages = context.get("chatMessages", [])
-    
-    # Format products section
-    products_section = "Current Selected Products:\n"
-    for product in products:
-        products_section += f"- {product['title']} (${product['price']:.2f})\n"
-        if product.get('description'):
-            products_section += f"  Description: {product['description']}\n"
-        products_section += f"  Category: {product.get('category', 'uncategorized')}, Tier: {product.get('tier', 'unspecified')}\n\n"
-    
-    # Format summary section
-    summary_section = f"Product Summary:\n{summary}\n\n" if summary else ""
-    
-    # Format chat history section
-    chat_history = "Recent Chat History:\n"
-    for msg in chat_messages[-5:]:  # Only include last 5 messages for context
-        chat_history += f"{msg['role']}: {msg['content']}\n"
-    
-    # Combine all sections into the final system prompt
-    system_prompt = f"""You are an AI assistant for Brightside, a supplement company. 
+PROMPT_HEADER = """You are an AI assistant for Brightside, a supplement company.
 Your role is to help customers understand our products and their benefits.
 
 Guidelines:
@@ -42,12 +10,156 @@ Guidelines:
 - DO NOT give medical advice
 - Keep answers clear and concise
 - Use accessible language, avoid technical jargon
-- If unsure about something, say so rather than making assumptions
+- If unsure about something, say so rather than making assumptions"""
+
+PROMPT_FOOTER = "Please use the above context to provide informed and personalized responses to the user's questions."
+
+# Only the most recent messages are included for context
+MAX_HISTORY_MESSAGES = 5
+
+# Progressively tighter limits applied when the prompt is over budget
+SUMMARY_TRIM_CHARS = (600, 200, 0)
+DESCRIPTION_TRIM_CHARS = (300, 120, 0)
+
+ProductKey = Tuple[str, float, str, str, str]
+
+class PromptBuild(NamedTuple):
+    text: str
+    estimated_tokens: int
+    trimmed: Tuple[str, ...] = ()
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for English text (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+def _field(item: Any, name: str, default: Any = None) -> Any:
+    # Context entries arrive as plain dicts or as validated pydantic models
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+def _product_key(product: Any) -> ProductKey:
+    return (
+        _field(product, "title"),
+        float(_field(product, "price")),
+        _field(product, "description") or "",
+        _field(product, "category") or "uncategorized",
+        _field(product, "tier") or "unspecified"
+    )
+
+def _truncate(text: str, max_chars: Optional[int]) -> str:
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "…"
+
+@lru_cache(maxsize=512)
+def _render_products(products: Tuple[ProductKey, ...], description_chars: Optional[int] = None) -> str:
+    """Render the product block. Memoized per product set, since it is identical on every turn."""
+    lines = ["Current Selected Products:"]
+    for title, price, description, category, tier in products:
+        lines.append(f"- {title} (${price:.2f})")
+        description = _truncate(description, description_chars)
+        if description:
+            lines.append(f"  Description: {description}")
+        lines.append(f"  Category: {category}, Tier: {tier}\n")
+    return "\n".join(lines) + "\n"
+
+def _render_summary(summary: str) -> str:
+    return f"Product Summary:\n{summary}\n\n" if summary else ""
+
+def _render_history(messages: List[Any], conversation_summary: str = "") -> str:
+    lines = [f"Earlier in this conversation:\n{conversation_summary}\n"] if conversation_summary else []
+    lines.append("Recent Chat History:")
+    lines.extend(f"{_field(msg, 'role')}: {_field(msg, 'content')}" for msg in messages)
+    return "\n".join(lines) + "\n"
+
+def _assemble(products_section: str, summary_section: str, chat_history: str) -> str:
+    return f"""{PROMPT_HEADER}
 
 {products_section}
 {summary_section}
 {chat_history}
 
-Please use the above context to provide informed and personalized responses to the user's questions."""
-    
-    return system_prompt 
\ No newline at end of file
+{PROMPT_FOOTER}"""
+
+def build_system_prompt(context: Dict, max_tokens: Optional[int] = None) -> PromptBuild:
+    """
+    Build the chat system prompt, keeping it within an estimated token budget.
+
+    When the prompt is over budget, the lowest-priority context is trimmed
+    first: older chat history and the compacted conversation summary, then
+    the summary, then product descriptions, and finally whole products from
+    the end of the list.
+
+    Args:
+        context: Dictionary containing products, answers, summary, and chat messages
+        max_tokens: Estimated token budget for the system prompt, or None for no limit
+
+    Returns:
+        PromptBuild: The prompt text, its estimated token count and what was trimmed
+    """
+    products = tuple(_product_key(product) for product in context.get("products") or [])
+    summary = context.get("summary") or ""
+    history = list(context.get("chatMessages") or [])[-MAX_HISTORY_MESSAGES:]
+    conversation_summary = context.get("conversationSummary") or ""
+
+    description_chars: Optional[int] = None
+    summary_chars: Optional[int] = None
+    trimmed: List[str] = []
+
+    def render() -> str:
+        return _assemble(
+            _render_products(products, description_chars),
+            _render_summary(_truncate(summary, summary_chars)),
+            _render_history(history, conversation_summary)
+        )
+
+    text = render()
+    if max_tokens is None:
+        return PromptBuild(text, estimate_tokens(text))
+
+    while (history or conversation_summary) and estimate_tokens(text) > max_tokens:
+        if conversation_summary:
+            conversation_summary = ""
+        else:
+            history.pop(0)
+        text = render()
+        if "history" not in trimmed:
+            trimmed.append("history")
+
+    for limit in SUMMARY_TRIM_CHARS:
+        if not summary or estimate_tokens(text) <= max_tokens:
+            break
+        summary_chars = limit
+        text = render()
+        if "summary" not in trimmed:
+            trimmed.append("summary")
+
+    for limit in DESCRIPTION_TRIM_CHARS:
+        if estimate_tokens(text) <= max_tokens:
+            break
+        description_chars = limit
+        text = render()
+        if "descriptions" not in trimmed:
+            trimmed.append("descriptions")
+
+    while products and estimate_tokens(text) > max_tokens:
+        products = products[:-1]
+        text = render()
+        if "products" not in trimmed:
+            trimmed.append("products")
+
+    return PromptBuild(text, estimate_tokens(text), tuple(trimmed))
+
+def format_context_to_system_prompt(context: Dict, max_tokens: Optional[int] = None) -> str:
+    """
+    Formats the context information into a comprehensive system prompt for GPT.
+
+    Args:
+        context: Dictionary containing products, answers, summary, and chat messages
+        max_tokens: Optional estimated token budget, see `build_system_prompt`
+
+    Returns:
+        str: Formatted system prompt
+    """
+    return build_system_prompt(context, max_tokens).text
@@ -0,0 +1,39 @@
+import json
+from typing import Any, Iterable, Optional
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class RawJSONResponse(Response):
+    """
+    JSON response whose body is already encoded. Returning it from a route
+    skips FastAPI's response-model validation and the stdlib encoder.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return dumps(content)
+
+def splice_array(items: Iterable[bytes]) -> bytes:
+    """Join pre-encoded JSON values into a JSON array."""
+    return b"[" + b",".join(items) + b"]"
+
+def products_body(encoded_products: Iterable[bytes], next_cursor: Optional[str] = None) -> bytes:
+    """A SearchResponse body assembled from pre-encoded products."""
+    return b'{"products":' + splice_array(encoded_products) + b',"next_cursor":' + dumps(next_cursor) + b"}"
+
+def products_response(encoded_products: Iterable[bytes], next_cursor: Optional[str] = None) -> RawJSONResponse:
+    return RawJSONResponse(products_body(encoded_products, next_cursor))
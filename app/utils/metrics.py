@@ -0,0 +1,303 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+
+# Latency buckets in seconds, from in-memory lookups up to slow LLM completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def items(self) -> List[Tuple[Labels, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self.items()
+        ]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.inc(labels, -amount)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items]
+
+class CallbackGauge(_Metric):
+    """Gauge whose samples are computed at scrape time, e.g. from a live object's state."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Dict[Labels, float]]
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self.callback().items()
+        ]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._values.items()]
+        lines = []
+        for labels, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(cumulative)}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route, method and status.",
+    ("route", "method", "status")
+))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served."
+))
+UPSTREAM_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to upstream services by operation and outcome.",
+    ("upstream", "operation", "outcome")
+))
+UPSTREAM_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "upstream_requests_in_flight",
+    "Calls to upstream services currently in progress.",
+    ("upstream",)
+))
+UPSTREAM_HEDGES = REGISTRY.register(Counter(
+    "upstream_hedged_requests_total",
+    "Hedged upstream reads, by which attempt answered first (primary or hedge).",
+    ("upstream", "winner")
+))
+OPENAI_TOKENS = REGISTRY.register(Counter(
+    "openai_tokens_total",
+    "OpenAI tokens used, by endpoint and kind (prompt, completion, or cached prompt tokens).",
+    ("endpoint", "kind")
+))
+EMBEDDING_BATCH_SIZE = REGISTRY.register(Histogram(
+    "embedding_batch_size",
+    "Number of distinct texts sent per embeddings call.",
+    (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "cache_lookups_total",
+    "Result cache lookups by cache and result (hit or miss).",
+    ("cache", "result")
+))
+
+def _cache_hit_ratios() -> Dict[Labels, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in CACHE_LOOKUPS.items():
+        hits_and_lookups = totals.setdefault(cache, [0.0, 0.0])
+        hits_and_lookups[1] += value
+        if result == "hit":
+            hits_and_lookups[0] += value
+    return {(cache,): hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+REGISTRY.register(CallbackGauge(
+    "cache_hit_ratio",
+    "Fraction of result cache lookups that were hits since startup.",
+    ("cache",),
+    _cache_hit_ratios
+))
+
+def cached_prompt_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prompt cache, when reported."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+
+def record_token_usage(endpoint: str, usage) -> None:
+    """Count prompt/completion tokens from an OpenAI `usage` object, if present."""
+    if usage is None:
+        return
+    OPENAI_TOKENS.inc((endpoint, "prompt"), getattr(usage, "prompt_tokens", 0) or 0)
+    OPENAI_TOKENS.inc((endpoint, "completion"), getattr(usage, "completion_tokens", 0) or 0)
+    OPENAI_TOKENS.inc((endpoint, "cached"), cached_prompt_tokens(usage))
+
+@contextmanager
+def track_upstream(upstream: str, operation: str) -> Iterator[None]:
+    """Time one upstream call and count it as in flight while the block runs."""
+    UPSTREAM_REQUESTS_IN_FLIGHT.inc((upstream,))
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+        outcome = "rate_limited" if status == 429 else "error"
+        raise
+    finally:
+        UPSTREAM_REQUESTS_IN_FLIGHT.dec((upstream,))
+        UPSTREAM_REQUEST_SECONDS.observe((upstream, operation, outcome), time.perf_counter() - started)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency and in-flight requests.
+
+    Routes are labelled by their path template (not the raw path) so label
+    cardinality stays bounded. Streaming responses are timed until their
+    last body chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: Optional[Dict[Callable, str]] = None
+
+    def _route_template(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._templates is None:
+            router = scope["app"].router
+            self._templates = {
+                route.endpoint: route.path for route in router.routes if hasattr(route, "endpoint")
+            }
+        return self._templates.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = ["500"]
+        recorded = [False]
+
+        def record() -> None:
+            if not recorded[0]:
+                recorded[0] = True
+                HTTP_REQUESTS_IN_FLIGHT.dec()
+                HTTP_REQUEST_SECONDS.observe(
+                    (self._route_template(scope), scope["method"], status[0]),
+                    time.perf_counter() - started
+                )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record()
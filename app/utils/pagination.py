@@ -0,0 +1,53 @@
+import base64
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+def filters_fingerprint(filters: Optional[Dict[str, str]], query: Optional[str] = None) -> str:
+    """Short, order-independent fingerprint of a filter set and optional search query."""
+    state: Any = filters or {}
+    if query is not None:
+        state = [state, query]
+    canonical = json.dumps(state, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
+def encode_cursor(
+    mode: str,
+    offset: Any,
+    filters: Optional[Dict[str, str]] = None,
+    query: Optional[str] = None
+) -> str:
+    """
+    Encode a pagination position into an opaque, URL-safe cursor.
+
+    The cursor is bound to the filters (and search query) it was issued
+    for, so it can't be replayed against a different query.
+    """
+    state = {"m": mode, "o": offset, "f": filters_fingerprint(filters, query)}
+    raw = json.dumps(state, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(
+    cursor: str,
+    mode: str,
+    filters: Optional[Dict[str, str]] = None,
+    query: Optional[str] = None
+) -> Any:
+    """
+    Decode a cursor produced by `encode_cursor` and return its offset.
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another mode or filter set.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state: Dict[str, Any] = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        offset = state["o"]
+        issued_mode = state["m"]
+        fingerprint = state["f"]
+    except Exception:
+        raise ValueError("Malformed cursor")
+
+    if issued_mode != mode or fingerprint != filters_fingerprint(filters, query):
+        raise ValueError("Cursor does not match this search")
+    return offset
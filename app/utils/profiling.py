@@ -0,0 +1,252 @@
+import asyncio
+import contextvars
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..config import get_settings
+from .request_log import current_request_id, log_fields
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+
+# Captured profiles are named "<epoch ms>-<request id>.prof"
+PROFILE_NAME_RE = re.compile(r"^(\d+)-([A-Za-z0-9_.-]{1,64})\.prof$")
+
+# (name, description, start, duration) per completed phase of the current
+# request, or None when the request isn't being timed
+_phases: "contextvars.ContextVar[Optional[List[Tuple[str, Optional[str], float, float]]]]" = \
+    contextvars.ContextVar("profile_phases", default=None)
+_request_started: "contextvars.ContextVar[float]" = contextvars.ContextVar("profile_request_started", default=0.0)
+
+# cProfile hooks the whole thread, so only one request is captured at a time
+_capturing = False
+
+@contextmanager
+def phase(name: str, description: Optional[str] = None) -> Iterator[None]:
+    """
+    Time a block as a named phase of the current request, reported in its
+    Server-Timing header. Nearly free when the request isn't being timed.
+    """
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases.append((name, description, started, time.perf_counter() - started))
+
+def phase_since_start(name: str, description: Optional[str] = None) -> None:
+    """
+    Record the time from the start of the request until now as a phase,
+    e.g. body parsing and dependencies, which run before the handler.
+    """
+    phases = _phases.get()
+    if phases is not None:
+        started = _request_started.get()
+        phases.append((name, description, started, time.perf_counter() - started))
+
+def server_timing(phases: List[Tuple[str, Optional[str], float, float]], started: float, now: float) -> str:
+    """
+    Render phases as a Server-Timing header value. Time after the last phase
+    ended (mostly response serialization) is reported as `serialize`, and
+    the whole request as `total`.
+    """
+    entries = []
+    for name, description, _, duration in phases:
+        entry = f"{name};dur={duration * 1000:.2f}"
+        if description:
+            entry += f';desc="{description}"'
+        entries.append(entry)
+    if phases:
+        last_end = max(start + duration for _, _, start, duration in phases)
+        entries.append(f"serialize;dur={max(0.0, now - last_end) * 1000:.2f}")
+    entries.append(f"total;dur={(now - started) * 1000:.2f}")
+    return ", ".join(entries)
+
+def current_server_timing() -> Optional[str]:
+    """
+    Server-Timing value for the current request so far, or None when it
+    isn't being timed. Streaming routes send it as a final event, since
+    their header went out before the upstream phases ran.
+    """
+    phases = _phases.get()
+    if phases is None:
+        return None
+    return server_timing(phases, _request_started.get(), time.perf_counter())
+
+class ProfileStore:
+    """
+    Bounded on-disk ring buffer of captured cProfile stats: once more than
+    `max_profiles` files exist, the oldest are deleted. Files are plain
+    `pstats` dumps, shared by every worker writing to the same directory.
+    """
+
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    @staticmethod
+    def profile_name(request_id: str) -> str:
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", request_id)[:64] or "request"
+        return f"{int(time.time() * 1000)}-{safe_id}.prof"
+
+    def save(self, profiler: cProfile.Profile, name: str) -> None:
+        """
+        Write a profile and drop the oldest ones beyond `max_profiles`.
+        Blocking; call it off the event loop.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.directory, name))
+        except OSError as e:
+            logger.warning(f"Could not save profile {name}: {str(e)}")
+            return
+        for stale in self.list()[self.max_profiles:]:
+            try:
+                os.unlink(os.path.join(self.directory, stale["name"]))
+            except OSError:
+                pass
+
+    def list(self) -> List[Dict]:
+        """Captured profiles, newest first."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        profiles = []
+        for name in names:
+            match = PROFILE_NAME_RE.match(name)
+            if match is None:
+                continue
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            profiles.append({
+                "name": name,
+                "request_id": match.group(2),
+                "captured_at": int(match.group(1)) / 1000.0,
+                "bytes": size
+            })
+        profiles.sort(key=lambda profile: profile["name"], reverse=True)
+        return profiles
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of a captured profile, or None for unknown (or unsafe) names."""
+        if not PROFILE_NAME_RE.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+@lru_cache()
+def get_profile_store() -> ProfileStore:
+    """Return the process-wide ProfileStore, creating it on first use."""
+    settings = get_settings()
+    return ProfileStore(settings.profile_dir, max_profiles=settings.profile_max_files)
+
+def profile_token_valid(provided: Optional[str], token: str) -> bool:
+    return bool(token) and provided is not None and hmac.compare_digest(provided, token)
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware for opt-in request profiling.
+
+    A request is timed when it carries `X-Profile: timing` (or `cprofile`)
+    with the admin `X-Profile-Token`, or when it falls in the timing sample.
+    Timed requests get a `Server-Timing` header listing the phases recorded
+    with `phase`. The header is written when the response starts, so for
+    streamed responses it only covers what ran before the first chunk;
+    streaming routes report the rest in a final `timing` event. `X-Profile: cprofile` requests, and a sampled fraction of
+    the rest, are also run under cProfile and saved to the profile store.
+
+    cProfile sees everything on the event loop thread while it is enabled,
+    so other requests served concurrently show up in a capture too; work
+    running on executor threads doesn't.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        token: str = "",
+        timing_sample_rate: float = 0.0,
+        capture_sample_rate: float = 0.0
+    ):
+        self.app = app
+        self.store = store
+        self.token = token
+        self.timing_sample_rate = timing_sample_rate
+        self.capture_sample_rate = capture_sample_rate
+
+    def _requested(self, scope) -> Optional[str]:
+        mode = provided = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                mode = value.decode("latin-1").strip().lower()
+            elif name == b"x-profile-token":
+                provided = value.decode("latin-1")
+        if mode in ("timing", "cprofile") and profile_token_valid(provided, self.token):
+            return mode
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = self._requested(scope)
+        if mode is None and self.capture_sample_rate and random.random() < self.capture_sample_rate:
+            mode = "cprofile"
+        if mode is None and self.timing_sample_rate and random.random() < self.timing_sample_rate:
+            mode = "timing"
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        global _capturing
+        started = time.perf_counter()
+        phases: List[Tuple[str, Optional[str], float, float]] = []
+        phases_token = _phases.set(phases)
+        started_token = _request_started.set(started)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", server_timing(phases, started, time.perf_counter()).encode("latin-1"))
+                ]
+            await send(message)
+
+        profiler = None
+        if mode == "cprofile" and not _capturing:
+            _capturing = True
+            profiler = cProfile.Profile()
+        try:
+            if profiler is None:
+                await self.app(scope, receive, send_wrapper)
+            else:
+                # Named up front so the access event, emitted with the last body chunk, can carry it
+                name = self.store.profile_name(current_request_id() or "request")
+                log_fields(profile=name)
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    profiler.disable()
+                    _capturing = False
+                    # Dumping and pruning touch the disk, so keep them off the event loop
+                    await asyncio.get_running_loop().run_in_executor(None, self.store.save, profiler, name)
+        finally:
+            _request_started.reset(started_token)
+            _phases.reset(phases_token)
@@ -0,0 +1,179 @@
+import logging
+import math
+import time
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+class RateLimit(NamedTuple):
+    capacity: float
+    refill_per_second: float
+
+    @classmethod
+    def per_hour(cls, requests: int) -> "RateLimit":
+        return cls(capacity=float(requests), refill_per_second=requests / 3600.0)
+
+class RateLimitBackend:
+    """
+    Token-bucket storage. `acquire` atomically refills the bucket for `key`,
+    takes `cost` tokens if available and returns (allowed, retry_after_seconds).
+    """
+
+    async def acquire(self, key: str, limit: RateLimit, cost: float = 1.0) -> Tuple[bool, float]:
+        raise NotImplementedError
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-process token buckets holding two floats per key.
+
+    A bucket that has refilled completely is indistinguishable from a missing
+    one, so idle keys are swept out periodically and memory stays bounded by
+    the number of recently active clients.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        # key -> [tokens, last_refill, seconds_until_full]
+        self._buckets: Dict[str, List[float]] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def acquire(self, key: str, limit: RateLimit, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = limit.capacity
+        else:
+            tokens = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.refill_per_second)
+
+        allowed = tokens >= cost
+        retry_after = 0.0
+        if allowed:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / limit.refill_per_second
+
+        self._buckets[key] = [tokens, now, (limit.capacity - tokens) / limit.refill_per_second]
+        return allowed, retry_after
+
+    def _sweep(self, now: float) -> None:
+        idle = [key for key, (_, last, until_full) in self._buckets.items() if now - last >= until_full]
+        for key in idle:
+            del self._buckets[key]
+        self._next_sweep = now + self.sweep_interval
+
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets in Redis, shared by every worker and replica. The refill and
+    take happen in one Lua script, and keys expire once their bucket is full.
+    Requires the optional `redis` package (>= 4.2).
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The redis rate limit backend requires the 'redis' package")
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_TOKEN_BUCKET_SCRIPT)
+        self.prefix = prefix
+
+    async def acquire(self, key: str, limit: RateLimit, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, retry_after = await self._script(
+            keys=[f"{self.prefix}:{key}"],
+            args=[limit.capacity, limit.refill_per_second, cost]
+        )
+        return bool(int(allowed)), float(retry_after)
+
+class RateLimitExceeded(Exception):
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """
+    Applies a separate token-bucket limit per scope (e.g. "gpt" for /chat and
+    /classify, "search" for /search) to each client key.
+    """
+
+    def __init__(self, backend: Optional[RateLimitBackend], limits: Dict[str, RateLimit]):
+        self.backend = backend
+        self.limits = limits
+
+    async def check(self, scope: str, client_key: str, cost: float = 1.0) -> None:
+        """
+        Raises:
+            RateLimitExceeded: If the client has no tokens left in this scope.
+        """
+        limit = self.limits.get(scope)
+        if self.backend is None or limit is None:
+            return
+        try:
+            allowed, retry_after = await self.backend.acquire(f"{scope}:{client_key}", limit, cost)
+        except Exception as e:
+            # Fail open: a limiter outage shouldn't take the API down with it
+            logger.warning(f"Rate limit check failed for {scope}: {str(e)}")
+            return
+        if not allowed:
+            raise RateLimitExceeded(scope, retry_after)
+
+def create_rate_limit_backend(kind: str, redis_url: Optional[str] = None) -> Optional[RateLimitBackend]:
+    """
+    Build a rate limit backend from settings: "memory" (default), "redis", or "none" to disable limiting.
+    """
+    kind = (kind or "memory").lower()
+    if kind == "none":
+        return None
+    if kind == "redis":
+        if not redis_url:
+            raise RuntimeError("REDIS_URL must be set for the redis rate limit backend")
+        return RedisRateLimitBackend(redis_url)
+    return InMemoryRateLimitBackend()
+
+@lru_cache()
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide RateLimiter, creating it on first use."""
+    settings = get_settings()
+    backend = create_rate_limit_backend(settings.rate_limit_backend, settings.redis_url)
+    return RateLimiter(
+        backend,
+        {
+            "gpt": RateLimit.per_hour(settings.rate_limit_per_hour),
+            "search": RateLimit.per_hour(settings.search_rate_limit_per_hour)
+        }
+    )
+
+def retry_after_header(retry_after: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
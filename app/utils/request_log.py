@@ -0,0 +1,188 @@
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+access_logger = logging.getLogger("app.access")
+
+_request_id: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("request_id", default=None)
+# Fields accumulated for the current request's access event, and whether
+# verbose payloads are sampled for it
+_request_fields: "contextvars.ContextVar[Optional[Dict[str, Any]]]" = contextvars.ContextVar("request_fields", default=None)
+_payload_sampled: "contextvars.ContextVar[bool]" = contextvars.ContextVar("payload_sampled", default=False)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+def log_fields(**fields: Any) -> None:
+    """Attach fields to the current request's access event. No-op outside a request."""
+    current = _request_fields.get()
+    if current is not None:
+        current.update(fields)
+
+def payload_sampled() -> bool:
+    """Whether verbose payloads are being recorded for the current request."""
+    return _payload_sampled.get()
+
+def log_payload(**payloads: Any) -> None:
+    """Attach verbose payloads (bodies, raw model output) to sampled requests only."""
+    if _payload_sampled.get():
+        log_fields(**payloads)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request ID and any structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            event["request_id"] = request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            event.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+class _RequestQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the background writer. The request ID is stamped here,
+    on the calling task, since context variables don't cross to the writer
+    thread; tracebacks are rendered here too so the record can be pickled
+    or shared safely.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if not hasattr(record, "request_id"):
+            record.request_id = _request_id.get()
+        return record
+
+def configure_logging(level: str = "INFO", fmt: str = "json") -> None:
+    """
+    Route the root logger through an in-memory queue to a single writer
+    thread, so request handlers never block on stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    writer = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        writer.setFormatter(JsonFormatter())
+    else:
+        writer.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_RequestQueueHandler(records))
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class RequestLogMiddleware:
+    """
+    ASGI middleware emitting one structured access event per HTTP request.
+
+    Each request gets an ID (taken from `X-Request-ID` when the client sends
+    one) that is echoed in the response and stamped on every record logged
+    while serving it. Handlers add fields to the event with `log_fields`;
+    verbose payloads added with `log_payload` are kept for a sampled
+    fraction of requests only.
+    """
+
+    def __init__(self, app, payload_sample_rate: float = 0.0):
+        self.app = app
+        self.payload_sample_rate = payload_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        fields: Dict[str, Any] = {}
+        id_token = _request_id.set(request_id)
+        fields_token = _request_fields.set(fields)
+        sampled_token = _payload_sampled.set(random.random() < self.payload_sample_rate)
+
+        started = time.perf_counter()
+        status = [500]
+        logged = [False]
+
+        def emit() -> None:
+            if logged[0]:
+                return
+            logged[0] = True
+            client = scope.get("client")
+            access_logger.info(
+                "request",
+                extra={
+                    "request_id": request_id,
+                    "fields": {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status[0],
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                        "client": client[0] if client else None,
+                        **fields
+                    }
+                }
+            )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.lower().encode("latin-1"), request_id.encode("latin-1"))
+                ]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                emit()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            emit()
+            _payload_sampled.reset(sampled_token)
+            _request_fields.reset(fields_token)
+            _request_id.reset(id_token)
@@ -0,0 +1,56 @@
+import json
+from typing import Any, AsyncIterator, Dict, Tuple
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from .profiling import current_server_timing
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+Event = Tuple[str, Dict[str, Any]]
+
+def wants_ndjson(request: Request) -> bool:
+    """Clients opt into NDJSON with `Accept: application/x-ndjson`; SSE is the default."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def encode_event(event: str, data: Dict[str, Any], ndjson: bool = False) -> str:
+    """Encode one event as a server-sent event or as a single NDJSON line."""
+    if ndjson:
+        return json.dumps({"type": event, **data}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _encode_stream(
+    request: Request,
+    events: AsyncIterator[Event],
+    ndjson: bool
+) -> AsyncIterator[str]:
+    try:
+        async for event, data in events:
+            if await request.is_disconnected():
+                break
+            yield encode_event(event, data, ndjson)
+        else:
+            # Profiled requests get the full timings, which their header couldn't carry
+            timing = current_server_timing()
+            if timing is not None:
+                yield encode_event("timing", {"server_timing": timing}, ndjson)
+    except Exception as e:
+        yield encode_event("error", {"detail": str(e)}, ndjson)
+    finally:
+        # Closing the source propagates cancellation to any upstream stream
+        await events.aclose()
+
+def event_stream_response(request: Request, events: AsyncIterator[Event]) -> StreamingResponse:
+    """
+    Stream `(event, data)` pairs to the client as SSE or NDJSON.
+
+    The source generator is closed as soon as the client disconnects, so
+    abandoned requests stop consuming upstream tokens. Profiled requests end
+    with a `timing` event carrying their Server-Timing value.
+    """
+    ndjson = wants_ndjson(request)
+    return StreamingResponse(
+        _encode_stream(request, events, ndjson),
+        media_type=NDJSON_MEDIA_TYPE if ndjson else SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,8 @@
+"""
+Benchmark harness for the Brightside API.
+
+Runs `app.main:app` against an in-process fake Qdrant seeded with a
+synthetic catalog and a local OpenAI-compatible stand-in, drives the
+endpoints at a fixed concurrency and writes latency percentiles and
+throughput to a JSON file. See `python -m bench.run --help`.
+"""
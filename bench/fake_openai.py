@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CLASSIFY_MARKER = "product classification assistant"
+CHAT_REPLY = (
+    "Our sleep formula combines magnesium and melatonin to support restful sleep. "
+    "It is best taken about an hour before bed. Let me know if you'd like a comparison."
+)
+
+def create_app(latency: float = 0.5, jitter: float = 0.1, stream_chunks: int = 20) -> FastAPI:
+    """
+    Minimal OpenAI-compatible server: model lookup, chat completions
+    (plain and streamed) and embeddings, answering after a configurable
+    latency. Embeddings use the same hashing embedder as the fake Qdrant
+    catalog, so semantic results are meaningful.
+    """
+    app = FastAPI()
+
+    async def wait() -> None:
+        await asyncio.sleep(max(0.0, random.gauss(latency, jitter)))
+
+    @app.get("/v1/models/{model}")
+    async def retrieve_model(model: str):
+        return {"id": model, "object": "model", "created": 0, "owned_by": "bench"}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages: List[Dict[str, Any]] = body.get("messages", [])
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        content = _reply(messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4
+        }
+        completion_id = f"chatcmpl-bench-{time.monotonic_ns()}"
+
+        if not body.get("stream"):
+            await wait()
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+        async def chunks() -> AsyncIterator[str]:
+            # Time to first token is the configured latency; the rest trickles out
+            await wait()
+            step = max(1, len(content) // stream_chunks)
+            for start in range(0, len(content), step):
+                yield _sse(completion_id, body.get("model"), [{
+                    "index": 0,
+                    "delta": {"content": content[start:start + step]},
+                    "finish_reason": None
+                }])
+                await asyncio.sleep(latency / stream_chunks)
+            yield _sse(completion_id, body.get("model"), [{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield _sse(completion_id, body.get("model"), [], usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        from app.services.embedding_service import hashing_embedding
+
+        body = await request.json()
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        dimensions = body.get("dimensions") or 256
+        # Embedding calls are much faster than completions
+        await asyncio.sleep(max(0.0, random.gauss(latency / 10, jitter / 10)))
+        tokens = sum(len(text) for text in texts) // 4
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": hashing_embedding(text, dimensions)}
+                for i, text in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    return app
+
+def _reply(messages: List[Dict[str, Any]]) -> str:
+    system = next((str(m.get("content", "")) for m in messages if m.get("role") == "system"), "")
+    if CLASSIFY_MARKER in system:
+        # Small talk and medication questions fall back; anything else picks the first product
+        question = str(messages[-1].get("content", "")).lower()
+        if "thank" in question or "meds" in question:
+            return json.dumps({"status": "fallback", "products": []})
+        return json.dumps({"status": "ok", "products": [1]})
+    return CHAT_REPLY
+
+def _sse(completion_id: str, model: str, choices: List[Dict[str, Any]], usage: Dict[str, int] = None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": choices,
+        "usage": usage
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds before a reply (or first token)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="standard deviation of the latency")
+    parser.add_argument("--stream-chunks", type=int, default=20)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency, args.jitter, args.stream_chunks),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+        access_log=False
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+CATEGORIES = ("sleep", "energy", "digestion", "immunity", "brain", "bone", "heart", "stress")
+TIERS = ("essential", "premium", "elite")
+BENEFITS = (
+    "restful sleep", "steady energy", "gut comfort", "immune support", "focus and memory",
+    "bone density", "heart health", "calm mood", "joint mobility", "healthy skin"
+)
+INGREDIENTS = (
+    "magnesium", "melatonin", "vitamin d3", "calcium", "zinc", "ashwagandha", "probiotics",
+    "omega-3", "b12", "l-theanine", "turmeric", "vitamin c", "collagen", "coq10", "iron"
+)
+
+def synthetic_catalog(size: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Deterministic product payloads shaped like the production collection."""
+    rng = random.Random(seed)
+    products = []
+    for i in range(size):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        ingredients = rng.sample(INGREDIENTS, 3)
+        benefit = rng.choice(BENEFITS)
+        products.append({
+            "id": f"prod-{i:05d}",
+            "title": f"{category.title()} {ingredients[0].title()} Formula {i}",
+            "price": round(rng.uniform(9, 89), 2),
+            "description": (
+                f"A {category} supplement with {', '.join(ingredients)} "
+                f"formulated for {benefit}. " + "Third-party tested. " * rng.randint(1, 4)
+            ).strip(),
+            "image_url": f"https://cdn.example.com/products/{i}.png",
+            "tier": rng.choice(TIERS),
+            "category": category,
+            "variant_id": 40000000 + i
+        })
+    return products
+
+class FakeQdrantClient:
+    """
+    In-process stand-in for `qdrant_client.QdrantClient` covering the calls
+    the API makes, with an optional fixed latency per call to model the
+    network round-trip.
+    """
+
+    # Set by `install()` before the app constructs its client
+    catalog: List[Dict[str, Any]] = []
+    collection_name = "bench"
+    latency = 0.0
+    dimensions = 256
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        self.points = [
+            SimpleNamespace(id=i, payload=payload, vector=None)
+            for i, payload in enumerate(self.catalog)
+        ]
+        self.payload_schema: Dict[str, Any] = {}
+        self._vectors: Optional[List[List[float]]] = None
+
+    def _round_trip(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_collections(self):
+        self._round_trip()
+        return SimpleNamespace(collections=[SimpleNamespace(name=self.collection_name)])
+
+    def get_collection(self, collection_name: str):
+        self._round_trip()
+        return SimpleNamespace(points_count=len(self.points), payload_schema=dict(self.payload_schema))
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema: Any = None, **kwargs: Any):
+        self.payload_schema[field_name] = field_schema
+
+    def scroll(
+        self,
+        collection_name: str,
+        scroll_filter: Any = None,
+        limit: int = 10,
+        offset: Optional[int] = None,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        **kwargs: Any
+    ) -> Tuple[List[Any], Optional[int]]:
+        self._round_trip()
+        start = offset or 0
+        matched = []
+        position = start
+        while position < len(self.points) and len(matched) < limit:
+            point = self.points[position]
+            if _matches(point.payload, scroll_filter):
+                matched.append(point)
+            position += 1
+        return matched, (position if position < len(self.points) else None)
+
+    def search(
+        self,
+        collection_name: str,
+        query_vector: Any,
+        query_filter: Any = None,
+        limit: int = 10,
+        offset: int = 0,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        **kwargs: Any
+    ) -> List[Any]:
+        """Brute-force dot-product search over hashing embeddings of title and description."""
+        from app.services.embedding_service import hashing_embedding
+
+        self._round_trip()
+        if isinstance(query_vector, tuple):
+            query_vector = query_vector[1]
+        if self._vectors is None:
+            self._vectors = [
+                hashing_embedding(f"{p.payload['title']} {p.payload['description']}", self.dimensions)
+                for p in self.points
+            ]
+        scored = [
+            (sum(a * b for a, b in zip(query_vector, vector)), point)
+            for point, vector in zip(self.points, self._vectors)
+            if _matches(point.payload, query_filter)
+        ]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [
+            SimpleNamespace(id=point.id, payload=point.payload, score=score, vector=None)
+            for score, point in scored[offset:offset + limit]
+        ]
+
+    def close(self) -> None:
+        pass
+
+def _matches(payload: Dict[str, Any], scroll_filter: Any) -> bool:
+    if scroll_filter is None:
+        return True
+    return all(payload.get(condition.key) == condition.match.value for condition in scroll_filter.must or [])
+
+def install(
+    size: int,
+    latency: float = 0.0,
+    collection_name: str = "bench",
+    seed: int = 7,
+    dimensions: int = 256
+) -> None:
+    """Make `qdrant_client.QdrantClient` construct a FakeQdrantClient seeded with `size` products."""
+    import qdrant_client
+
+    FakeQdrantClient.catalog = synthetic_catalog(size, seed)
+    FakeQdrantClient.dimensions = dimensions
+    FakeQdrantClient.latency = latency
+    FakeQdrantClient.collection_name = collection_name
+    qdrant_client.QdrantClient = FakeQdrantClient
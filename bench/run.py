@@ -0,0 +1,272 @@
+"""
+Drive the API with concurrent load and record latency percentiles.
+
+Usage:
+    python -m bench.run --products 2000 --concurrency 32 --duration 20 \
+        --openai-latency 0.4 --endpoints search,classify,chat --output bench-results.json
+
+The API and the OpenAI stand-in are started as subprocesses, so the load
+generator doesn't share a GIL with the server under test. Extra settings
+can be passed with `--env KEY=VALUE` (e.g. `--env SEARCH_MODE=qdrant`).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from .fake_qdrant import CATEGORIES, TIERS, synthetic_catalog
+
+CLASSIFY_MESSAGES = (
+    "What helps with sleep?",
+    "Do you have anything with magnesium?",
+    "Can I take this with my blood pressure meds?",
+    "Thank you so much!",
+    "What's the difference between your brain supplements?",
+    "Which product is best for energy in the afternoon?"
+)
+SEMANTIC_QUERIES = (
+    "something to help me sleep through the night",
+    "magnesium for muscle cramps",
+    "gentle support for digestion and bloating",
+    "focus and memory for studying",
+    "energy without the jitters",
+    "calm mood and stress relief"
+)
+CHAT_MESSAGES = (
+    "How should I take this?",
+    "Is this good for sleep?",
+    "What are the main ingredients?",
+    "Can you compare these two?"
+)
+
+Payload = Callable[[random.Random], Dict[str, Any]]
+
+def request_factories(products: int, seed: int) -> Dict[str, Payload]:
+    catalog = synthetic_catalog(products, seed)
+
+    def search(rng: random.Random) -> Dict[str, Any]:
+        filters = rng.choice([
+            None,
+            {"category": rng.choice(CATEGORIES)},
+            {"category": rng.choice(CATEGORIES), "tier": rng.choice(TIERS)}
+        ])
+        return {"filters": filters, "limit": rng.choice((5, 10, 20))}
+
+    def semantic(rng: random.Random) -> Dict[str, Any]:
+        filters = rng.choice([None, {"tier": rng.choice(TIERS)}])
+        return {"query": rng.choice(SEMANTIC_QUERIES), "filters": filters, "limit": 10}
+
+    def classify(rng: random.Random) -> Dict[str, Any]:
+        products_sample = rng.sample(catalog, min(8, len(catalog)))
+        return {
+            "message": rng.choice(CLASSIFY_MESSAGES),
+            "products": [{"title": p["title"], "description": p["description"]} for p in products_sample]
+        }
+
+    def chat(rng: random.Random) -> Dict[str, Any]:
+        return {
+            "message": rng.choice(CHAT_MESSAGES),
+            "context": {
+                "products": rng.sample(catalog, min(3, len(catalog))),
+                "summary": "Shopper is looking for better sleep and steadier energy.",
+                "chatMessages": [{"role": "user", "content": "Hi, I have trouble sleeping."}]
+            }
+        }
+
+    def answer(rng: random.Random) -> Dict[str, Any]:
+        return {
+            "message": rng.choice(CLASSIFY_MESSAGES),
+            "context": {
+                "products": rng.sample(catalog, min(8, len(catalog))),
+                "summary": "Shopper is looking for better sleep and steadier energy.",
+                "chatMessages": []
+            }
+        }
+
+    return {"search": search, "semantic": semantic, "classify": classify, "chat": chat, "answer": answer}
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def summarize(latencies: List[float], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": dict(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else None,
+            "p50": ms(percentile(ordered, 0.50)),
+            "p95": ms(percentile(ordered, 0.95)),
+            "p99": ms(percentile(ordered, 0.99)),
+            "max": ms(ordered[-1]) if ordered else None
+        }
+    }
+
+async def drive(
+    client: httpx.AsyncClient,
+    path: str,
+    payload: Payload,
+    concurrency: int,
+    duration: float,
+    max_requests: Optional[int],
+    seed: int
+) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` workers each send one request at a time until time or budget runs out."""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    issued = [0]
+    started = time.perf_counter()
+    stop_at = started + duration
+
+    async def worker(worker_id: int) -> None:
+        rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < stop_at and (max_requests is None or issued[0] < max_requests):
+            issued[0] += 1
+            body = payload(rng)
+            sent = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if status == 200:
+                latencies.append(time.perf_counter() - sent)
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("API did not become ready in time")
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def server_env(args: argparse.Namespace, state_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        # A fresh snapshot per run, so no catalog from an earlier run is restored
+        "CATALOG_SNAPSHOT_PATH": os.path.join(state_dir, "catalog.bin"),
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+        "QDRANT_URL": "http://fake-qdrant",
+        "QDRANT_COLLECTION": "bench",
+        "RATE_LIMIT_BACKEND": "none",
+        "LOG_LEVEL": "WARNING"
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    factories = request_factories(args.products, args.seed)
+    paths = {
+        "search": "/api/v1/search",
+        "semantic": "/api/v1/search",
+        "classify": "/api/v1/classify",
+        "chat": "/api/v1/chat",
+        "answer": "/api/v1/answer"
+    }
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60.0) as client:
+        await wait_until_ready(client)
+        for endpoint in args.endpoints:
+            if args.warmup:
+                await drive(client, paths[endpoint], factories[endpoint], args.concurrency, args.warmup, None, args.seed)
+            results[endpoint] = await drive(
+                client, paths[endpoint], factories[endpoint],
+                args.concurrency, args.duration, args.requests, args.seed
+            )
+            print(f"{endpoint:>9}: {json.dumps(results[endpoint])}", flush=True)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API against local stand-ins")
+    parser.add_argument("--endpoints", default="search,semantic,classify,chat", type=lambda s: [e for e in s.split(",") if e])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per endpoint")
+    parser.add_argument("--requests", type=int, default=None, help="stop an endpoint after this many requests")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unrecorded load per endpoint")
+    parser.add_argument("--products", type=int, default=500, help="size of the synthetic catalog")
+    parser.add_argument("--qdrant-latency", type=float, default=0.0)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--openai-jitter", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--openai-port", type=int, default=8901)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the API process")
+    parser.add_argument("--output", default="bench-results.json")
+    args = parser.parse_args()
+
+    unknown = set(args.endpoints) - {"search", "semantic", "classify", "chat", "answer"}
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    state_dir = tempfile.mkdtemp(prefix="brightside-bench-")
+    env = server_env(args, state_dir)
+    openai_server = subprocess.Popen([
+        sys.executable, "-m", "bench.fake_openai",
+        "--port", str(args.openai_port),
+        "--latency", str(args.openai_latency),
+        "--jitter", str(args.openai_jitter)
+    ])
+    api_server = subprocess.Popen([
+        sys.executable, "-m", "bench.serve",
+        "--port", str(args.port),
+        "--products", str(args.products),
+        "--qdrant-latency", str(args.qdrant_latency)
+    ], env=env)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        for process in (api_server, openai_server):
+            process.terminate()
+        for process in (api_server, openai_server):
+            process.wait(timeout=10)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output", "port", "openai_port")
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import argparse
+import os
+
+from . import fake_qdrant
+
+def main() -> None:
+    """Serve `app.main:app` with the fake Qdrant client installed."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the API against the benchmark stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--products", type=int, default=500, help="size of the synthetic catalog")
+    parser.add_argument("--qdrant-latency", type=float, default=0.0, help="seconds added to every fake Qdrant call")
+    args = parser.parse_args()
+
+    fake_qdrant.install(
+        args.products,
+        latency=args.qdrant_latency,
+        collection_name=os.environ.setdefault("QDRANT_COLLECTION", "bench"),
+        dimensions=int(os.environ.get("EMBEDDING_DIMENSIONS") or 256)
+    )
+    uvicorn.run("app.main:app", host=args.host, port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import asyncio
+
+from app.config import get_settings
+from app.utils.api_utils import client_key
+from app.utils.rate_limit import InMemoryRateLimitBackend, RateLimit, RateLimiter, RateLimitExceeded
+
+class _Request:
+    def __init__(self, api_key: str):
+        self.headers = {"X-API-Key": api_key}
+
+async def _statuses(limiter: RateLimiter, api_keys) -> list:
+    statuses = []
+    for api_key in api_keys:
+        try:
+            await limiter.check("search", client_key("10.0.0.1", _Request(api_key)))
+            statuses.append(200)
+        except RateLimitExceeded:
+            statuses.append(429)
+    return statuses
+
+def test_rotating_api_key_does_not_reset_the_bucket(monkeypatch):
+    monkeypatch.setattr(get_settings(), "client_api_keys", [])
+    limiter = RateLimiter(InMemoryRateLimitBackend(), {"search": RateLimit.per_hour(3)})
+
+    statuses = asyncio.run(_statuses(limiter, [f"random-{i}" for i in range(5)]))
+
+    assert statuses == [200, 200, 200, 429, 429]
+
+def test_per_client_api_keys_get_their_own_buckets(monkeypatch):
+    monkeypatch.setattr(get_settings(), "client_api_keys", ["client-a", "client-b"])
+    limiter = RateLimiter(InMemoryRateLimitBackend(), {"search": RateLimit.per_hour(1)})
+
+    statuses = asyncio.run(_statuses(limiter, ["client-a", "client-b", "client-a"]))
+
+    assert statuses == [200, 200, 429]
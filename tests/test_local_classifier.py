@@ -0,0 +1,24 @@
+from app.models.schemas import ClassifyProduct
+from app.services.local_classifier import LocalClassifier
+
+PRODUCTS = [
+    ClassifyProduct(title="Sleep Well", description="Melatonin and magnesium for restful sleep"),
+    ClassifyProduct(title="GI Revive", description="Supports digestion and gut health"),
+    ClassifyProduct(title="Focus Plus", description="Nootropic blend for concentration")
+]
+
+def test_non_latin_questions_are_left_to_the_model():
+    classifier = LocalClassifier()
+    assert classifier.classify("睡眠に良い製品はどれですか", PRODUCTS) is None
+    assert classifier.classify("Какой продукт для сна?", PRODUCTS) is None
+
+def test_title_mention_is_confident_only_when_it_covers_the_question():
+    classifier = LocalClassifier()
+
+    about_one = classifier.classify("What are the side effects of GI Revive?", PRODUCTS)
+    assert about_one.required_context == ["GI Revive"]
+    assert about_one.confidence >= 0.9
+
+    mixed = classifier.classify("What's in Sleep Well and do you have anything for digestion?", PRODUCTS)
+    assert mixed.rule == "title_mention"
+    assert mixed.confidence < 0.9
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from app.services.upstream import CLOSED, HALF_OPEN, CircuitBreaker, UpstreamScheduler
+
+async def _cancel_call(scheduler: UpstreamScheduler) -> None:
+    async def hang(_timeout: float) -> None:
+        await asyncio.sleep(60)
+
+    call = asyncio.ensure_future(scheduler.call(hang, time.monotonic() + 60))
+    # Let the call take its slot and start the attempt
+    await asyncio.sleep(0.01)
+    call.cancel()
+    try:
+        await call
+    except asyncio.CancelledError:
+        pass
+
+def test_cancelled_call_returns_its_slot():
+    async def run() -> None:
+        scheduler = UpstreamScheduler("test-slots", initial_limit=2, max_limit=2)
+        for _ in range(3):
+            await _cancel_call(scheduler)
+        assert scheduler.in_flight == 0
+
+    asyncio.run(run())
+
+def test_cancelled_half_open_probe_is_given_back():
+    async def run() -> None:
+        breaker = CircuitBreaker("test-probes", half_open_calls=1)
+        scheduler = UpstreamScheduler("test-probes", breaker=breaker)
+        breaker._transition(HALF_OPEN)
+
+        await _cancel_call(scheduler)
+
+        # The probe slot is free again, and a successful probe still closes the circuit
+        async def succeed(_timeout: float) -> str:
+            return "ok"
+
+        assert await scheduler.call(succeed, time.monotonic() + 5) == "ok"
+        assert breaker.state == CLOSED
+
+    asyncio.run(run())